@@ -1,3 +1,4 @@
 """
 Created on Sun May  3 11:30:42 2020
-"""
\ No newline at end of file
+"""
+__version__ = '0.1.0'
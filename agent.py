@@ -1,5 +1,8 @@
-import sys
-from sclib.parameters import Parameters
+from sclib.parameters import Parameters, Role
+from sclib.volatility import RollingVolatility
+from sclib.discount import OpenLoans
+
+ROLES = {role.value: role for role in Role}                                    # Also found by a Role, which hashes as its letter.
 
 class Agent(Parameters):
     """
@@ -13,6 +16,20 @@ class Agent(Parameters):
     prod_cap: float
     fixed_cost: float
 
+    __slots__ = ('agent_id', 'working_capital', 'role', 'mu_selling_price', 'sigma_selling_price',
+                 'selling_price', 'q', 'consumer_demand_mean', 'consumer_demand', 'orders_succeeded',
+                 'prod_cap', 'fixed_cost', 'input_margin', 'interest_rate', 'ordering_period',
+                 'production_time', 'fixed_assets', 'days_between_financing', 'financing_period',
+                 'inventory_value', 'inventory_track', 'total_assets', 'sigma_assets', 'asset_volatility',
+                 'total_liabilities', 'equity', 'sigma_equity', 'estimated_assets', 'estimated_sigma_assets',
+                 'duration_of_obligations', 'distance_to_default', 'default_probability', 'payment_term',
+                 'tc_rate', 'long_term_debt', 'receivables', 'receivables_value', 'payables', 'payables_value',
+                 'financing_rate', 'total_credit_capacity', 'current_credit_capacity', 'liability',
+                 'financing_history', 'open_loans', 'time_of_next_allowed_financing', 'credit_availability',
+                 'in_default', 'bankruptcy', 'SCF_availability', 'SCF_capacity', 'RF_eligible_contracts',
+                 'scheduled_money_payment', 'log_liability',
+                 'RF_ratio', 'risk_free_rate', 'interest_rate_margin', 'ltd_volatility')    # Overridable Parameters.
+
     def __init__(self, 
                  agent_id: int, 
                  role: str, 
@@ -37,16 +54,18 @@ class Agent(Parameters):
          Inputs:
             agent_id: an integer or string, unique label 
             working_capital: an integer that 
-            role: a character that distinguishes the role of the agent as either
+            role: a character (or Role) that distinguishes the role of the agent as either
                   - 'r' for retailer
                   - 'm' for manufacturer
                   - 's' for supplier
         """
-        Parameters.__init__(self)
-
         self.agent_id = agent_id
         self.working_capital = working_capital
-        self.role = role
+        self.role = self.__check_role(role)
+        self.RF_ratio = Parameters.RF_ratio
+        self.risk_free_rate = Parameters.risk_free_rate
+        self.interest_rate_margin = Parameters.interest_rate_margin
+        self.ltd_volatility = Parameters.ltd_volatility
         self.mu_selling_price = mu_selling_price
         self.sigma_selling_price = sigma_selling_price
         self.selling_price = 0.0
@@ -61,28 +80,25 @@ class Agent(Parameters):
         self.fixed_assets = fixed_assets
         self.days_between_financing = days_between_financing
         self.financing_period = financing_period
-        self.list_working_capital = list()
         self.inventory_value = 0.0
         self.inventory_track = list()
         self.total_assets = 0.0
-        self.list_assets = list()
         self.sigma_assets = 0.0
+        self.asset_volatility = RollingVolatility(window = 180)                # Half-yearly log returns of total assets.
         self.total_liabilities = 0.0
         self.equity = 0.0
-        self.list_equity = list()
         self.sigma_equity = 0.0
         self.estimated_assets = 0.0
         self.estimated_sigma_assets = 0.0
         self.duration_of_obligations = 0.0
         self.distance_to_default = 0.0
         self.default_probability = 0.0
-        self.default_probability_history = list()
         self.payment_term = payment_term
         self.tc_rate = tc_rate
         self.long_term_debt = long_term_debt
-        self.receivables = list()
+        self.receivables = dict()                                              # {invoice_id: (amount, due_date, buyer_id)}, see TradeCreditLedger.
         self.receivables_value = 0.0
-        self.payables = list()
+        self.payables = dict()                                                 # {invoice_id: (amount, due_date, seller_id)}
         self.payables_value = 0.0
 
         self.financing_rate = 0.15
@@ -90,6 +106,7 @@ class Agent(Parameters):
         self.current_credit_capacity = 0.0
         self.liability = 0.0
         self.financing_history = list()
+        self.open_loans = OpenLoans()                                          # Loans not due yet, for duration_of_obligations.
         self.time_of_next_allowed_financing = 0.0
         self.credit_availability = False
         self.in_default = False
@@ -97,15 +114,21 @@ class Agent(Parameters):
         self.SCF_availability = False
         self.SCF_capacity = 0
         self.RF_eligible_contracts = list()
-        self.scheduled_money_payment = list()
-        self.SCF_history = list()
-        self.total_assets_history = list()
-        self.total_liabilities_history = list()
-        self.equity_history = list()
+        self.scheduled_money_payment = dict()                                  # {invoice_id: (amount, due_date)} owed to the bank after reverse factoring.
         self.log_liability = list()
-        self.__check_role()
         self.__assign_role_specific_attributes()
 
+    def __getstate__(self) -> dict:
+        """
+        The slots that are set, so that an agent without a __dict__ can be
+        pickled and copied.
+        """
+        return {name: getattr(self, name) for name in Agent.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state: dict) -> None:
+        for (name, value) in state.items():
+            setattr(self, name, value)
+
     def __assign_role_specific_attributes(self) -> None:
         """
         Private method to add the following attributes to the following roles:
@@ -123,12 +146,12 @@ class Agent(Parameters):
         if self.role == self.manufacturer:
             self.orders_succeeded = 0.0
 
-    def __check_role(self) -> None:
+    @staticmethod
+    def __check_role(role) -> Role:
         """
         Private method to check the sanity of the role
         """
-        if self.role in [self.retailer, self.manufacturer, self.supplier]:
-            return 
-        else:
-            raise ValueError(f'__check_role: self.role = "{self.role}" is undefined')
-            sys.exit(self.abort)
\ No newline at end of file
+        try:
+            return ROLES[role]
+        except (KeyError, TypeError):
+            raise ValueError(f'__check_role: self.role = "{role}" is undefined') from None
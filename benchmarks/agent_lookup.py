@@ -0,0 +1,61 @@
+"""
+Per-step time of Evolve.proceed() with the agent_id index used by
+Recorder.find_agent_by_id, compared against the former linear scan over
+list_agents.
+
+Usage:
+    python -m sclib.benchmarks.agent_lookup --sizes 100 1000 10000 --steps 5
+"""
+import io
+import time
+import argparse
+import contextlib
+from sclib.evolve import Evolve
+from sclib.synthetic import synthetic_agents
+
+
+def layer_sizes(n_agents: int) -> tuple:
+    """
+    n_agents split evenly between retailers, manufacturers and suppliers.
+    """
+    return tuple((n_agents * (layer + 1)) // 3 - (n_agents * layer) // 3 for layer in range(3))
+
+
+def linear_scan(model):
+    """
+    The lookup used before the agent_id index was introduced.
+    """
+    def find_agent_by_id(unique_id):
+        return [agent for agent in model.list_agents if unique_id == agent.agent_id][0]
+    return find_agent_by_id
+
+
+def time_per_step(n_agents: int, steps: int, scan: bool, seed: int = 1) -> float:
+    model = Evolve(synthetic_agents(*layer_sizes(n_agents), seed = seed), seed = seed)    # Same trajectory with either lookup.
+    model.activate_wcap_financing()
+    model.activate_SC_financing()
+    if scan:
+        model.find_agent_by_id = linear_scan(model)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.proceed(1)                                                       # Warm-up step, no orders are in flight yet.
+        start = time.perf_counter()
+        model.proceed(steps)
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [100, 1000, 10000])
+    parser.add_argument('--steps', type = int, default = 5)
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    print(f'{"agents":>8} {"scan [s/step]":>14} {"index [s/step]":>15} {"speed-up":>9}')
+    for n_agents in args.sizes:
+        before = time_per_step(n_agents, args.steps, scan = True, seed = args.seed)
+        after = time_per_step(n_agents, args.steps, scan = False, seed = args.seed)
+        print(f'{n_agents:>8} {before:>14.4f} {after:>15.4f} {before / after:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
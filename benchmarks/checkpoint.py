@@ -0,0 +1,75 @@
+"""
+Overhead of checkpointing on Evolve.proceed(), with a budget.
+
+A run with checkpoints every --every steps is timed against the time its
+Checkpointer spent writing; the overhead is that time as a share of the
+steps themselves. The history is preallocated for --reserve steps, as a long
+run would be, so that the cost of a checkpoint does not depend on its size.
+The seconds of each checkpoint are also reported: they must stay flat as the
+run grows, since the history, archived orders and loans go to segments.
+
+Usage:
+    python -m sclib.benchmarks.checkpoint
+    python -m sclib.benchmarks.checkpoint --layers 1000,1000,1000 --steps 300 --every 100 --budget 0.15
+"""
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from sclib.evolve import Evolve
+from sclib.synthetic import synthetic_agents
+
+
+def measure(layers: tuple, steps: int, every: int, reserve: int, seed: int) -> dict:
+    """
+    Runs steps steps with a checkpoint every every steps and returns the
+    seconds of the steps, of each checkpoint and the overhead.
+    """
+    model = Evolve(synthetic_agents(*layers, seed = seed), seed = seed)
+    model.activate_wcap_financing()
+    model.activate_SC_financing()
+    model.history.reserve(reserve)
+    directory = tempfile.mkdtemp()
+    try:
+        model.activate_checkpointing(directory, every_steps = every, every_seconds = None)
+        checkpoints = list()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(steps // every):
+                before = model.checkpointer.seconds
+                model.proceed(every)
+                checkpoints.append(model.checkpointer.seconds - before)
+            seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+    checkpoint_seconds = sum(checkpoints)
+    return {'step_seconds': seconds - checkpoint_seconds,
+            'checkpoints': checkpoints,
+            'overhead': checkpoint_seconds / (seconds - checkpoint_seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--layers', default = '300,300,300', help = 'retailers,manufacturers,suppliers')
+    parser.add_argument('--steps', type = int, default = 500)
+    parser.add_argument('--every', type = int, default = 100, help = 'steps between checkpoints')
+    parser.add_argument('--reserve', type = int, default = 5000, help = 'steps preallocated in the history')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--budget', type = float, default = 0.15, help = 'overhead allowed, as a share of the step time')
+    args = parser.parse_args()
+
+    layers = tuple(int(size) for size in args.layers.split(','))
+    result = measure(layers, args.steps, args.every, args.reserve, args.seed)
+    print(f'steps {result["step_seconds"]:.2f} s, checkpoints '
+          f'{" ".join(f"{seconds:.3f}" for seconds in result["checkpoints"])} s')
+    flag = '  OVER BUDGET' if result['overhead'] > args.budget else ''
+    print(f'overhead {result["overhead"]:.1%} (budget {args.budget:.0%}){flag}')
+    if flag:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
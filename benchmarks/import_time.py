@@ -0,0 +1,68 @@
+"""
+Import time of sclib modules, with a budget for the simulation core.
+
+Every module is imported in a fresh interpreter; the fastest of --repeat
+imports is kept. The core modules (CORE) must import within --budget seconds
+and without loading any of HEAVY, which are only meant to be imported when a
+DataFrame is built or a chart is plotted.
+
+Usage:
+    python -m sclib.benchmarks.import_time
+    python -m sclib.benchmarks.import_time --budget 0.2 --repeat 10 --modules sclib.evolve sclib.sweep
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import sclib
+
+CORE = ('sclib.agent', 'sclib.evolve', 'sclib.replication', 'sclib.checkpoint')
+OTHERS = ('sclib.generate_agents', 'sclib.sweep', 'sclib.cache', 'sclib.visualizer')
+HEAVY = ('pandas', 'scipy', 'matplotlib')
+
+MEASURE = ('import sys, time, json\n'
+           'start = time.perf_counter()\n'
+           'import {module}\n'
+           'seconds = time.perf_counter() - start\n'
+           'heavy = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy}))\n'
+           'print(json.dumps({{"seconds": seconds, "heavy": heavy}}))\n')
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    """
+    Seconds to import module in a fresh interpreter (fastest of repeat runs)
+    and the HEAVY packages it loaded.
+    """
+    environment = dict(os.environ)
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(sclib.__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [package_parent, environment.get('PYTHONPATH')]))
+    code = MEASURE.format(module = module, heavy = HEAVY)
+    results = [json.loads(subprocess.run([sys.executable, '-c', code], capture_output = True, text = True,
+                                         env = environment, check = True).stdout)
+               for _ in range(repeat)]
+    return {'seconds': min(result['seconds'] for result in results), 'heavy': results[0]['heavy']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--modules', nargs = '+', help = 'modules to measure; CORE and OTHERS by default')
+    parser.add_argument('--budget', type = float, default = 0.3, help = 'seconds allowed for importing a core module')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'imports per module; the fastest is kept')
+    args = parser.parse_args()
+
+    failures = list()
+    print(f'{"module":<24} {"seconds":>8}  heavy dependencies loaded')
+    for module in args.modules or CORE + OTHERS:
+        result = measure(module, args.repeat)
+        over_budget = module in CORE and (result['seconds'] > args.budget or result['heavy'])
+        flag = '  OVER BUDGET' if over_budget else ''
+        print(f'{module:<24} {result["seconds"]:>8.3f}  {", ".join(result["heavy"]) or "-"}{flag}')
+        if over_budget:
+            failures.append(module)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Memory per Agent, per Order_Package and per trade-credit invoice.
+
+Objects are created under tracemalloc, so the figures are the bytes Python
+allocates per object, including its containers.
+
+Usage:
+    python -m sclib.benchmarks.memory --agents 30000 --orders 100000 --invoices 100000
+"""
+import gc
+import argparse
+import tracemalloc
+from sclib.order import Order_Package
+from sclib.event_calendar import EventCalendar
+from sclib.ledger import TradeCreditLedger
+from sclib.generate_agents import build_agents
+from sclib.synthetic import synthetic_table
+
+
+def bytes_per_object(create, n: int) -> float:
+    """
+    Bytes allocated per object by create(n), which returns the n objects.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / n
+
+
+def agents(n: int) -> float:
+    table = synthetic_table(n // 3, n // 3, n - 2 * (n // 3))
+    return bytes_per_object(lambda _: build_agents(table), n)
+
+
+def orders(n: int) -> float:
+    return bytes_per_object(lambda n: [Order_Package(100.0, 0, 1, 1.5, number) for number in range(n)], n)
+
+
+def invoices(n: int) -> float:
+    (seller, buyer) = build_agents(synthetic_table(1, 1, 1))[1:]
+    ledger = TradeCreditLedger(EventCalendar())
+    def issue(n):
+        for step in range(n):
+            ledger.issue(seller, 10.0, step, buyer = buyer)
+        return ledger
+    return bytes_per_object(issue, n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--agents', type = int, default = 30000)
+    parser.add_argument('--orders', type = int, default = 100000)
+    parser.add_argument('--invoices', type = int, default = 100000)
+    args = parser.parse_args()
+
+    print(f'{"object":<16} {"count":>8} {"bytes/object":>13}')
+    print(f'{"Agent":<16} {args.agents:>8} {agents(args.agents):>13.0f}')
+    print(f'{"Order_Package":<16} {args.orders:>8} {orders(args.orders):>13.0f}')
+    print(f'{"invoice":<16} {args.invoices:>8} {invoices(args.invoices):>13.0f}')
+
+
+if __name__ == '__main__':
+    main()
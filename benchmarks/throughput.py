@@ -0,0 +1,163 @@
+"""
+Throughput of Evolve.proceed() on synthetic populations, with JSON baselines.
+
+Every case (agents per layer x steps x flags) runs in its own process, so
+that its peak RSS is its own. A case reports steps per second, the time to
+build its population, its peak RSS and, with --phases, the share of each
+phase of a step (from a separate, profiled run, so the timing stays clean).
+With --repeat n, the fastest of n runs is kept, which damps the noise of a
+shared machine. The flag vectorized runs the same case on the array engine,
+whose trajectories are identical, so the two cases compare directly.
+
+Usage:
+    python -m sclib.benchmarks.throughput --suite quick --save baseline.json
+    python -m sclib.benchmarks.throughput --suite quick --compare baseline.json
+    python -m sclib.benchmarks.throughput --layers 1000,1000,1000 --steps 300 --flags wcap scf
+    python -m sclib.benchmarks.throughput --layers 1000,1000,1000 --steps 300 --flags wcap scf vectorized
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import itertools
+import contextlib
+import subprocess
+import sclib
+from sclib.evolve import Evolve
+from sclib.synthetic import synthetic_agents
+
+FLAGS = {'wcap': 'activate_wcap_financing',
+         'scf': 'activate_SC_financing',
+         'shuffle': 'always_shuffle',
+         'vectorized': 'activate_vectorized_engine'}
+
+SUITES = {'quick': {'layers': [(4, 3, 3), (100, 100, 100), (1000, 1000, 1000)],
+                    'steps': [300],
+                    'flags': [(), ('wcap', 'scf', 'shuffle'), ('wcap', 'scf', 'shuffle', 'vectorized')]},
+          'full': {'layers': [(4, 3, 3), (100, 100, 100), (1000, 1000, 1000), (10000, 10000, 10000), (20000, 15000, 15000)],
+                   'steps': [300, 1000, 5000],
+                   'flags': [(), ('wcap',), ('scf',), ('shuffle',), ('wcap', 'scf', 'shuffle'),
+                             ('vectorized',), ('wcap', 'scf', 'shuffle', 'vectorized')]}}
+
+
+def case_name(layers: tuple, steps: int, flags: tuple) -> str:
+    return f'{"-".join(map(str, layers))}x{steps}' + ''.join(f'+{flag}' for flag in flags)
+
+
+def run_case(layers: tuple, steps: int, flags: tuple, seed: int, phases: bool, repeat: int = 1) -> dict:
+    """
+    Runs one case in this process and returns its measurements.
+    """
+    seconds = build_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model = Evolve(synthetic_agents(*layers, seed = seed), seed = seed)
+        build_seconds = min(build_seconds, time.perf_counter() - start)
+        for flag in flags:
+            getattr(model, FLAGS[flag])()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            model.proceed(steps)
+            seconds = min(seconds, time.perf_counter() - start)
+    result = {'steps_per_second': steps / seconds,
+              'seconds': seconds,
+              'build_seconds': build_seconds,
+              'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}   # Linux reports kilobytes.
+
+    if phases:
+        model = Evolve(synthetic_agents(*layers, seed = seed), seed = seed)
+        for flag in flags:
+            getattr(model, FLAGS[flag])()
+        model.activate_profiling()
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.proceed(steps)
+        result['phases'] = model.profiler.summary()['share'].round(4).to_dict()
+    return result
+
+
+def run_in_subprocess(layers: tuple, steps: int, flags: tuple, seed: int, phases: bool, repeat: int = 1) -> dict:
+    case = json.dumps({'layers': layers, 'steps': steps, 'flags': flags, 'seed': seed, 'phases': phases, 'repeat': repeat})
+    environment = dict(os.environ)
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(sclib.__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [package_parent, environment.get('PYTHONPATH')]))
+    completed = subprocess.run([sys.executable, '-m', 'sclib.benchmarks.throughput', '--case', case],
+                               capture_output = True, text = True, env = environment, check = True)
+    return json.loads(completed.stdout)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Prints the change of every case against baseline and returns the names of
+    the cases slower by more than tolerance (a fraction).
+    """
+    regressions = list()
+    for (name, result) in results.items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['steps_per_second']
+        change = result['steps_per_second'] / before - 1
+        rss_change = result['peak_rss_mb'] / baseline['results'][name]['peak_rss_mb'] - 1
+        flag = '  REGRESSION' if change < -tolerance else ''
+        print(f'{name:<40} {change:>+8.1%} steps/s {rss_change:>+8.1%} RSS{flag}')
+        if change < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[1])
+    parser.add_argument('--suite', choices = sorted(SUITES), default = 'quick')
+    parser.add_argument('--layers', nargs = '+', help = 'agents per layer as r,m,s; overrides the suite')
+    parser.add_argument('--steps', type = int, nargs = '+', help = 'step counts; overrides the suite')
+    parser.add_argument('--flags', nargs = '*', choices = sorted(FLAGS), help = 'one flag set; overrides the suite')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--repeat', type = int, default = 1, help = 'runs per case; the fastest is kept')
+    parser.add_argument('--phases', action = 'store_true', help = 'add per-phase shares from a profiled run')
+    parser.add_argument('--save', help = 'write the results to this JSON file')
+    parser.add_argument('--compare', help = 'compare with the results of this JSON file')
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'allowed loss of steps/s before a case counts as a regression')
+    parser.add_argument('--case', help = argparse.SUPPRESS)                     # Set by run_in_subprocess.
+    args = parser.parse_args()
+
+    if args.case:
+        case = json.loads(args.case)
+        print(json.dumps(run_case(tuple(case['layers']), case['steps'], tuple(case['flags']), case['seed'], case['phases'], case['repeat'])))
+        return
+
+    suite = SUITES[args.suite]
+    layers = [tuple(int(n) for n in value.split(',')) for value in args.layers] if args.layers else suite['layers']
+    steps = args.steps or suite['steps']
+    flag_sets = [tuple(args.flags)] if args.flags is not None else suite['flags']
+
+    results = dict()
+    print(f'{"case":<40} {"steps/s":>10} {"build [s]":>10} {"peak RSS [MB]":>14}')
+    for (layer_sizes, n_steps, flags) in itertools.product(layers, steps, flag_sets):
+        name = case_name(layer_sizes, n_steps, flags)
+        result = run_in_subprocess(layer_sizes, n_steps, flags, args.seed, args.phases, args.repeat)
+        results[name] = result
+        print(f'{name:<40} {result["steps_per_second"]:>10.1f} {result["build_seconds"]:>10.3f} {result["peak_rss_mb"]:>14.1f}')
+        for (phase, share) in list(result.get('phases', dict()).items())[:5]:
+            print(f'    {phase:<54} {share:>6.1%}')
+
+    report = {'sclib': sclib.__version__,
+              'python': platform.python_version(),
+              'machine': platform.platform(),
+              'processor': platform.processor(),
+              'results': results}
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent = 2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+On-disk cache of the results of seeded runs, keyed by a hash of everything
+that determines them.
+"""
+import os
+import io
+import json
+import zipfile
+import hashlib
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+from sclib import __version__
+from sclib.evolve import Evolve
+from sclib.parameters import Parameters
+from sclib.replication import METRICS
+from sclib.sweep import CONSTANTS, population
+
+
+class ResultCache:
+    """
+    Results of runs stored as one .npz file per configuration in a directory.
+    The key of a configuration is the sha256 of the agent table, the point
+    of overrides (as in sclib.sweep), the values of Parameters, the options
+    applied to the model, the number of steps, the seed and the library
+    version, so changing any of them misses the cache. The key is computed
+    from these inputs alone; a model is only built on a miss. Each
+    file also holds its key and a checksum of its arrays and is dropped when
+    either does not match. Files are written atomically, a hit refreshes the
+    modification time of its file, and the least recently used files are
+    removed once the directory grows beyond max_bytes.
+    """
+    def __init__(self, directory: str = None, max_bytes: int = 2 ** 30):
+        """
+        constructor
+         Input:
+           directory: where entries are stored; ~/.cache/sclib by default.
+           max_bytes: size cap of the entries in bytes.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', 'sclib')
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, df: pd.DataFrame, steps: int, seed: int, options: tuple = (), point: dict = None) -> str:
+        """
+        The sha256 hex digest identifying a configuration. options are the
+        names of the Evolve methods called before the run, in that order.
+        """
+        point = dict(point or {})
+        for option in options:
+            if not callable(getattr(Evolve, option, None)):
+                raise ValueError(f'key: Evolve has no option "{option}"')
+        parameters = {name: value for (name, value) in vars(Parameters).items() if not name.startswith('_')}
+        parameters.update({name: float(value) for (name, value) in point.items() if name in CONSTANTS})
+        description = json.dumps({'version': __version__,
+                                  'columns': [str(name) for name in df.columns],
+                                  'dtypes': [str(dtype) for dtype in df.dtypes],
+                                  'point': point,
+                                  'parameters': parameters,
+                                  'options': list(options),
+                                  'steps': steps,
+                                  'seed': seed}, sort_keys = True, default = str)
+        digest = hashlib.sha256(description.encode())
+        digest.update(pd.util.hash_pandas_object(df, index = True).values.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict:
+        """
+        The arrays stored under key, or None if there are none or they are
+        corrupt.
+        """
+        path = self.__path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files if not name.startswith('__')}
+                stored_key = str(entry['__key'])
+                checksum = str(entry['__checksum'])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        if stored_key != key or checksum != self.__checksum(arrays):
+            os.remove(path)
+            return None
+        os.utime(path)                                                         # Most recently used.
+        return arrays
+
+    def put(self, key: str, arrays: dict) -> None:
+        """
+        Stores arrays under key and evicts the least recently used entries
+        beyond max_bytes.
+        """
+        (handle, temporary) = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, __key = np.array(key), __checksum = np.array(self.__checksum(arrays)), **arrays)
+            os.replace(temporary, self.__path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.__evict()
+
+    def run(self, df: pd.DataFrame, steps: int, seed: int, options: tuple = (), point: dict = None, metrics: tuple = METRICS) -> dict:
+        """
+        Runs the population of df (with the overrides of point, see
+        sclib.sweep.population) for steps steps, seeded with seed, after
+        calling the Evolve methods named in options, unless the result is
+        cached already.
+         Returns:
+           {metric: array of shape (agents, steps)}, the matrices of the log_*
+           DataFrames.
+        """
+        if seed is None:
+            raise ValueError('run: only seeded runs can be cached')
+        for name in metrics:
+            if name not in METRICS:
+                raise ValueError(f'run: unknown metric "{name}"')
+        key = self.key(df, steps, seed, options, point)
+        arrays = self.get(key)
+        if arrays is not None and all(name in arrays for name in metrics):
+            self.hits += 1
+            return {name: arrays[name] for name in metrics}
+
+        self.misses += 1
+        model = self.__model(df, seed, options, point or {})
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.proceed(steps)
+        n_agents = len(model.list_agents)
+        arrays = {name: np.array(model.history.matrix(name, 1, steps, n_agents)) for name in METRICS}
+        self.put(key, arrays)
+        return {name: arrays[name] for name in metrics}
+
+    def clear(self) -> None:
+        for (path, _, _) in self.__entries():
+            os.remove(path)
+
+    def __model(self, df: pd.DataFrame, seed: int, options: tuple, point: dict) -> Evolve:
+        model = Evolve(population(df, point), seed = seed)
+        for option in options:
+            getattr(model, option)()
+        return model
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    @staticmethod
+    def __checksum(arrays: dict) -> str:
+        digest = hashlib.sha256()
+        for name in sorted(arrays):
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+        return digest.hexdigest()
+
+    def __entries(self) -> list:
+        """
+        (path, size, modification time) of the entries, least recently used
+        first.
+        """
+        entries = list()
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((os.path.join(self.directory, name), stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key = lambda entry: entry[2])
+
+    def __evict(self) -> None:
+        entries = self.__entries()
+        total = sum(size for (_, size, _) in entries)
+        for (path, size, _) in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,301 @@
+import gc
+import os
+import re
+import time
+import copyreg
+import pickle
+import tempfile
+from array import array
+from operator import attrgetter
+from typing import NamedTuple
+from sclib.agent import Agent
+from sclib.order import Order_Package
+
+order_row = attrgetter(*Order_Package.__slots__)                               # Segments keep orders as rows: half the pickling time of objects.
+
+
+class Segments(NamedTuple):
+    """
+    What the segments of a checkpoint directory hold up to a step.
+    """
+    orders: dict                                                               # order_number -> archived Order_Package
+    loans: dict                                                                # agent_id -> first loans of its financing_history
+    history: list                                                              # (first step, rows for HistoryStore.fill())
+
+
+class StoredLoans:
+    """
+    Stands in for the financing_history of an agent in a snapshot: the loans
+    after the stored ones, which are in the segments.
+    """
+    __slots__ = ('agent_id', 'tail')
+
+    def __init__(self, agent_id: int, tail: list):
+        self.agent_id = agent_id
+        self.tail = tail
+
+    def __reduce__(self):
+        return (stored_loans, (self.agent_id, self.tail))
+
+
+class OrderList(list):
+    """
+    A list of orders, such as Evolve.list_orders, in a snapshot. Exact lists
+    do not go through SnapshotPickler.reducer_override(); this copy does, so
+    the stored orders in it are written as an array of order numbers.
+    """
+
+
+def stored_order(order_number: int):
+    raise ValueError(f'stored_order: order {order_number} is in a checkpoint segment; use Evolve.resume()')
+
+
+def stored_order_list(numbers: array, others: list):
+    raise ValueError(f'stored_order_list: {len(numbers) - len(others)} orders are in checkpoint segments; use Evolve.resume()')
+
+
+def stored_loans(agent_id: int, tail: list):
+    raise ValueError(f'stored_loans: loans of agent {agent_id} are in a checkpoint segment; use Evolve.resume()')
+
+
+class SnapshotPickler(pickle.Pickler):
+    """
+    Pickler of Evolve.snapshot() that leaves out what a Checkpointer has
+    already written to its segments: the archived orders whose id() is in
+    stored_orders are written as references to their order_number, and the
+    first stored_loans[agent_id] loans of the financing_history of an agent
+    are dropped. An OrderList is written as an array of order numbers and
+    the orders not stored.
+    """
+    def __init__(self, file, stored_orders: set, stored_loans: dict):
+        super().__init__(file, protocol = pickle.HIGHEST_PROTOCOL)
+        self.stored_orders = stored_orders
+        self.stored_loans = stored_loans
+
+    def reducer_override(self, obj):
+        if type(obj) is Order_Package and id(obj) in self.stored_orders:
+            return (stored_order, (obj.order_number,))
+        if type(obj) is OrderList:
+            return (stored_order_list, (array('q', [order.order_number for order in obj]),
+                                        [order for order in obj if id(order) not in self.stored_orders]))
+        if type(obj) is Agent and self.stored_loans.get(obj.agent_id):
+            state = obj.__getstate__()
+            state['financing_history'] = StoredLoans(obj.agent_id, obj.financing_history[self.stored_loans[obj.agent_id]:])
+            return (copyreg.__newobj__, (Agent,), state)
+        return NotImplemented
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    """
+    Unpickler that resolves the references of SnapshotPickler from stored
+    (a Segments).
+    """
+    def __init__(self, file, stored: Segments):
+        super().__init__(file)
+        self.stored = stored
+
+    def find_class(self, module: str, name: str):
+        if module == __name__ and name == 'stored_order':
+            return self.stored.orders.__getitem__
+        if module == __name__ and name == 'stored_order_list':
+            return self.order_list
+        if module == __name__ and name == 'stored_loans':
+            return self.loans
+        return super().find_class(module, name)
+
+    def loans(self, agent_id: int, tail: list) -> list:
+        if agent_id not in self.stored.loans:
+            stored_loans(agent_id, tail)
+        return self.stored.loans[agent_id] + tail
+
+    def order_list(self, numbers: array, others: list) -> list:
+        others = iter(others)
+        return [self.stored.orders[number] if number in self.stored.orders else next(others) for number in numbers]
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a model to files of one directory. A checkpoint
+    is the output of Evolve.snapshot() without the parts of the state that
+    only grow, written to a temporary file in the same directory and moved
+    over its final name with os.replace, so a file named
+    checkpoint_<step>.sclib is always complete even if the process is killed
+    while writing. Only the keep most recent checkpoints are kept.
+
+    The parts of the state that only grow are written incrementally: each
+    checkpoint first writes the steps of the history recorded, the orders
+    archived and the loans taken since the previous one to a
+    segment_<first>_<last>.pkl file, and leaves them out of the checkpoint
+    (see SnapshotPickler). A checkpoint thus costs about the same at step 100
+    and at step 10000. The segments are all kept (together they hold the
+    history of the run) and Evolve.resume() reads them back with
+    read_segments(). A directory holds the checkpoints of one run. The time
+    spent writing is accumulated to report the overhead.
+    """
+    pattern = re.compile(r'checkpoint_(\d+)\.sclib$')
+    segment_pattern = re.compile(r'segment_(\d+)_(\d+)\.pkl$')
+
+    def __init__(self, directory: str, every_steps: int = None, every_seconds: float = None, keep: int = 2):
+        """
+        constructor
+         Input:
+           directory: where checkpoints are written; created if missing.
+           every_steps: a checkpoint is written every every_steps steps.
+           every_seconds: a checkpoint is written when every_seconds seconds
+                          have passed since the last one.
+           keep: number of checkpoints kept.
+        """
+        if every_steps is None and every_seconds is None:
+            raise ValueError('Checkpointer: give every_steps, every_seconds or both')
+        if every_steps is not None and every_steps < 1:
+            raise ValueError(f'Checkpointer: every_steps = {every_steps} must be at least 1')
+        if keep < 1:
+            raise ValueError(f'Checkpointer: keep = {keep} must be at least 1')
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.written = 0
+        self.seconds = 0.0                                                     # Time spent writing checkpoints.
+        self.segment_steps = 0                                                 # Steps written to segments.
+        self.segment_orders = 0                                                # Archived orders written to segments.
+        self.segment_loans = dict()                                            # agent_id -> loans written to segments.
+        self._stored = set()                                                   # id() of the archived orders written to segments.
+        self._last_time = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_last_time'] = None                                             # The clock of another process means nothing here.
+        state['_stored'] = set()                                               # Nor its id(); rebuilt by the next write().
+        return state
+
+    def due(self, step: int) -> bool:
+        """
+        Whether a checkpoint should be written after step.
+        """
+        if self._last_time is None:
+            self._last_time = time.monotonic()
+        if self.every_steps is not None and step % self.every_steps == 0:
+            return True
+        return self.every_seconds is not None and time.monotonic() - self._last_time >= self.every_seconds
+
+    def write(self, model, step: int) -> str:
+        """
+        Writes the checkpoint of model at step and returns its path.
+        """
+        start = time.perf_counter()
+        enabled = gc.isenabled()
+        gc.disable()                                                           # As in Evolve.snapshot(), for the segment as well.
+        try:
+            self.__write_segment(model, step)
+            data = model.snapshot(history = False, stored_orders = self._stored, stored_loans = self.segment_loans)
+        finally:
+            if enabled:
+                gc.enable()
+        path = self.__write_file(f'checkpoint_{step:09d}.sclib', lambda file: file.write(data))
+        for old in self.checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+        self.written += 1
+        self.seconds += time.perf_counter() - start
+        self._last_time = time.monotonic()
+        return path
+
+    def __write_segment(self, model, step: int) -> None:
+        """
+        Writes what model recorded, archived and lent since the previous
+        segment up to step.
+        """
+        archived_orders = model.order_book.archived_orders
+        if len(self._stored) < self.segment_orders:                            # Unpickled with the model.
+            self._stored = set(map(id, archived_orders[:self.segment_orders]))
+        if step > self.segment_steps:
+            loans = {agent.agent_id: agent.financing_history[self.segment_loans.get(agent.agent_id, 0):] for agent in model.list_agents
+                     if len(agent.financing_history) > self.segment_loans.get(agent.agent_id, 0)}
+            segment = {'history': model.history.segment(self.segment_steps + 1, step),
+                       'orders': list(map(order_row, archived_orders[self.segment_orders:])),
+                       'loans': loans}
+            self.__write_file(f'segment_{self.segment_steps + 1:09d}_{step:09d}.pkl',
+                              lambda file: pickle.dump(segment, file, protocol = pickle.HIGHEST_PROTOCOL))
+            self._stored.update(map(id, archived_orders[self.segment_orders:]))
+            (self.segment_steps, self.segment_orders) = (step, len(archived_orders))
+            for (agent_id, new_loans) in loans.items():
+                self.segment_loans[agent_id] = self.segment_loans.get(agent_id, 0) + len(new_loans)
+
+    def __write_file(self, name: str, write) -> str:
+        """
+        Calls write(file) on a temporary file and moves it to name in the
+        directory once it is complete; returns its path.
+        """
+        path = os.path.join(self.directory, name)
+        (handle, temporary) = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                write(file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return path
+
+    @classmethod
+    def read_segments(cls, directory: str, last_step: int) -> Segments:
+        """
+        The contents of the segments in directory that cover steps 1 to
+        last_step. A run killed after its last checkpoint may have left
+        segments that end later, or that start where a segment of the resumed
+        run starts; a chain of consecutive segments ending at last_step is
+        taken, which holds the same values whichever segments it is made of,
+        since a resumed run repeats its steps exactly.
+        """
+        ends = dict()                                                          # first step -> (last step, name) of the longest fitting segment
+        for name in os.listdir(directory):
+            match = cls.segment_pattern.match(name)
+            if match and int(match.group(2)) <= last_step:
+                (first_step, segment_last_step) = (int(match.group(1)), int(match.group(2)))
+                ends[first_step] = max(ends.get(first_step, (0, '')), (segment_last_step, name))
+        stored = Segments(dict(), dict(), list())
+        reached = 0
+        while reached < last_step:
+            if reached + 1 not in ends:
+                raise ValueError(f'read_segments: the segments in {directory} cover steps 1 to {reached}, not {last_step}')
+            (segment_last_step, name) = ends[reached + 1]
+            with open(os.path.join(directory, name), 'rb') as file:
+                segment = pickle.load(file)
+            for row in segment['orders']:
+                order = Order_Package.__new__(Order_Package)
+                for (name, value) in zip(Order_Package.__slots__, row):
+                    setattr(order, name, value)
+                stored.orders[order.order_number] = order
+            for (agent_id, loans) in segment['loans'].items():
+                stored.loans.setdefault(agent_id, list()).extend(loans)
+            stored.history.append((reached + 1, segment['history']))
+            reached = segment_last_step
+        return stored
+
+    @classmethod
+    def step(cls, path: str) -> int:
+        """
+        The step of the checkpoint file path.
+        """
+        return int(cls.pattern.match(os.path.basename(path)).group(1))
+
+    @classmethod
+    def checkpoints(cls, directory: str) -> list:
+        """
+        Paths of the checkpoints in directory, oldest step first.
+        """
+        steps = [(int(match.group(1)), name) for name in os.listdir(directory) for match in [cls.pattern.match(name)] if match]
+        return [os.path.join(directory, name) for (_, name) in sorted(steps)]
+
+    @classmethod
+    def latest(cls, directory: str) -> str:
+        """
+        Path of the checkpoint of the latest step in directory.
+        """
+        checkpoints = cls.checkpoints(directory)
+        if not checkpoints:
+            raise ValueError(f'latest: no checkpoint in {directory}')
+        return checkpoints[-1]
@@ -0,0 +1,137 @@
+from heapq import heappush, heappop
+from collections import OrderedDict
+from typing import NamedTuple
+
+class DiscountTables:
+    """
+    Memo of compounding tables. table(rate, horizon)[k] is (1 + rate / year) ** k
+    for k = 0 .. horizon, computed with the same expression as the per-call
+    code, so growth() and discounting by it give identical results. Tables
+    are keyed by (rate, horizon rounded up to a power of two) and the least
+    recently used ones are evicted beyond max_tables. They pay off for rates
+    that stay put, such as financing_rate; the interest rates of buyers move
+    every step once credit rating starts, so each would build a table used
+    once, and factor() computes their single factor instead.
+    """
+    def __init__(self, year: int = 360, max_tables: int = 256):
+        """
+        constructor
+         Input:
+           year: number of steps in a year; rates are annual.
+           max_tables: number of tables kept.
+        """
+        self.year = year
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def table(self, rate: float, horizon: int) -> list:
+        """
+        A table of compounding factors covering at least 0 .. horizon periods.
+        """
+        size = 1 << int(horizon).bit_length()                                 # Power of two above horizon.
+        key = (rate, size)
+        table = self._tables.get(key)
+        if table is None:
+            base = 1 + (rate / self.year)
+            table = [base ** k for k in range(size)]
+            self._tables[key] = table
+            if len(self._tables) > self.max_tables:
+                self._tables.popitem(last = False)
+        else:
+            self._tables.move_to_end(key)
+        return table
+
+    def growth(self, rate: float, periods: int) -> float:
+        """
+        (1 + rate / year) ** periods; divide by it to discount.
+        """
+        if periods < 0:                                                        # Overdue items; not worth a table.
+            return self.factor(rate, periods)
+        return self.table(rate, periods)[periods]
+
+    def factor(self, rate: float, periods: int) -> float:
+        """
+        growth() without a table, for a rate that is not used again.
+        """
+        return (1 + (rate / self.year)) ** periods
+
+
+class Loan(NamedTuple):
+    amount: float                                                              # Compounded value owed at due_step.
+    start_step: int
+    due_step: int
+
+
+class OpenLoans:
+    """
+    The loans of an agent that are not due yet, with running sums that give
+    their duration without revisiting them. With w_i = amount_i discounted
+    from its due date back to an origin step, the duration at step t is
+    sum(w_i * due_i) / sum(w_i) - t: the common discount factor from the
+    origin to t cancels out. Matured loans leave through a heap ordered by
+    due date, and the origin is moved forward (rebased) every rebase_steps
+    steps or when the rate changes, which also recomputes the sums from the
+    open loans and clears their rounding error.
+    """
+    rebase_steps = 360
+    __slots__ = ('_heap', '_sequence', '_rate', '_origin', '_sum_weights', '_sum_weighted_due')
+
+    def __init__(self):
+        """
+        constructor
+        """
+        self._heap = list()                                                    # (due_date, sequence, amount, weight)
+        self._sequence = 0
+        self._rate = None
+        self._origin = 0
+        self._sum_weights = 0.0
+        self._sum_weighted_due = 0.0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def open(self, amount: float, due_date: int, step: int, rate: float, tables: DiscountTables) -> None:
+        """
+        Adds a loan of amount, repaid at due_date, taken at step.
+        """
+        self.__close_matured(step)
+        if rate != self._rate or step - self._origin > self.rebase_steps:
+            self.__rebase(step, rate, tables)
+        weight = amount / tables.growth(rate, due_date - self._origin)
+        heappush(self._heap, (due_date, self._sequence, amount, weight))
+        self._sequence += 1
+        self._sum_weights += weight
+        self._sum_weighted_due += weight * due_date
+
+    def duration(self, step: int, rate: float, tables: DiscountTables) -> float:
+        """
+        Duration of the loans not due at step, discounted at rate; 1 if there
+        are none.
+        """
+        self.__close_matured(step)
+        if not self._heap:
+            return 1
+        if rate != self._rate or step - self._origin > self.rebase_steps:
+            self.__rebase(step, rate, tables)
+        if self._sum_weights == 0:
+            return 1
+        return self._sum_weighted_due / self._sum_weights - step
+
+    def __close_matured(self, step: int) -> None:
+        while self._heap and self._heap[0][0] <= step:
+            (due_date, _, _, weight) = heappop(self._heap)
+            self._sum_weights -= weight
+            self._sum_weighted_due -= weight * due_date
+        if not self._heap:
+            self._sum_weights = self._sum_weighted_due = 0.0
+
+    def __rebase(self, step: int, rate: float, tables: DiscountTables) -> None:
+        self._rate = rate
+        self._origin = step
+        self._heap = [(due_date, sequence, amount, amount / tables.growth(rate, due_date - step))
+                      for (due_date, sequence, amount, _) in self._heap]         # Same order, so still a heap.
+        self._sum_weights = sum(loan[3] for loan in self._heap)
+        self._sum_weighted_due = sum(loan[3] * loan[0] for loan in self._heap)
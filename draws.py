@@ -0,0 +1,85 @@
+from math import log
+import numpy as np
+
+class StepDraws:
+    """
+    The random inputs of a step, drawn for the whole population in one call
+    per distribution. The parameters of the draws (log of mu_selling_price,
+    sigma_selling_price and consumer_demand_mean of the retailers) are cached
+    in arrays, which invalidate() marks stale when the population changes.
+
+    Each step takes one row of standard normals (one per agent, in the order
+    of list_agents) and one row of standard exponentials (one per retailer),
+    so rows can be generated block_steps steps ahead without changing the
+    values: the result of a seeded run does not depend on block_steps. When
+    the population changes, invalidate() gives the rows drawn ahead back to
+    the generators, which then stand where drawing step by step leaves them.
+    """
+    def __init__(self, list_agents: list, price_rng: np.random.Generator, demand_rng: np.random.Generator, block_steps: int = 1):
+        """
+        constructor
+         Input:
+           list_agents: the list_agents of the model.
+           price_rng: generator of the selling price draws.
+           demand_rng: generator of the consumer demand draws.
+           block_steps: number of steps drawn at once.
+        """
+        self.list_agents = list_agents
+        self.price_rng = price_rng
+        self.demand_rng = demand_rng
+        self.block_steps = block_steps
+        self._normals = self._exponentials = None
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached parameters and the steps drawn ahead; called when
+        agents are added or their price or demand parameters change.
+        """
+        if self._normals is not None and self._served < self._last_step:     # Rewinds, then redraws the rows used.
+            used = self._served - self._first_step + 1
+            (self.price_rng.bit_generator.state, self.demand_rng.bit_generator.state) = self._states
+            self.price_rng.standard_normal((used, self._normals.shape[1]))
+            self.demand_rng.standard_exponential((used, self._exponentials.shape[1]))
+        self._stale = True
+        self._normals = self._exponentials = None
+        self._first_step = self._last_step = self._served = 0                # Steps covered by the rows drawn ahead; last step drawn for.
+        self._states = None                                                    # States of the generators before the block.
+
+    def __refresh(self) -> None:
+        agents = self.list_agents
+        self.log_mu = np.fromiter((log(agent.mu_selling_price) for agent in agents), float, len(agents))
+        self.sigma = np.fromiter((agent.sigma_selling_price for agent in agents), float, len(agents))
+        self.retailers = [agent for agent in agents if agent.role == agent.retailer]
+        self.demand_mean = np.fromiter((agent.consumer_demand_mean for agent in self.retailers), float, len(self.retailers))
+        self._stale = False
+
+    def __rows(self, step: int) -> int:
+        """
+        The row of the block holding step, drawing a new block if needed.
+        """
+        if self._stale:
+            self.__refresh()
+        if not self._first_step <= step <= self._last_step:
+            self._states = (self.price_rng.bit_generator.state, self.demand_rng.bit_generator.state)
+            self._normals = self.price_rng.standard_normal((self.block_steps, len(self.log_mu)))
+            self._exponentials = self.demand_rng.standard_exponential((self.block_steps, len(self.demand_mean)))
+            self._first_step, self._last_step = step, step + self.block_steps - 1
+        self._served = step
+        return step - self._first_step
+
+    def prices(self, step: int) -> np.ndarray:
+        """
+        Lognormal selling prices of all agents at step, in the order of
+        list_agents.
+        """
+        row = self.__rows(step)
+        return np.exp(self.log_mu + self.sigma * self._normals[row])
+
+    def demand(self, step: int) -> list:
+        """
+        (retailer, exponential demand draw) pairs of all retailers at step, in
+        the order of list_agents.
+        """
+        row = self.__rows(step)
+        return list(zip(self.retailers, (self.demand_mean * self._exponentials[row]).tolist()))
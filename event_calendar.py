@@ -0,0 +1,53 @@
+from heapq import heappush, heappop
+from collections import defaultdict
+
+class EventCalendar:
+    """
+    A step-bucketed calendar of due-dated events. Events are filed in channels
+    (e.g. settlements, loan repayments, deliveries) and inside each channel in
+    buckets keyed by their due step, so the phases of Evolve that drain a
+    channel only touch the events that are due instead of scanning the whole
+    book of outstanding receivables, payables, loans and delivery plans.
+    """
+    settlement = 'settlement'
+    repayment = 'repayment'
+    delivery_to_manufacturer = 'delivery_to_manufacturer'
+    delivery_to_retailer = 'delivery_to_retailer'
+    delivery_by_retailer = 'delivery_by_retailer'
+
+    def __init__(self):
+        """
+        constructor
+        """
+        self._buckets = defaultdict(dict)                                      # channel -> {due_step: [event, ...]}
+        self._due_steps = defaultdict(list)                                    # channel -> heap of the due steps present in _buckets
+
+    def __len__(self) -> int:
+        """
+        Number of events that have not been drained yet.
+        """
+        return sum(len(bucket) for buckets in self._buckets.values() for bucket in buckets.values())
+
+    def schedule(self, channel: str, due_step: int, event) -> None:
+        """
+        Files an event in a channel under its due step.
+        """
+        buckets = self._buckets[channel]
+        bucket = buckets.get(due_step)
+        if bucket is None:
+            bucket = buckets[due_step] = list()
+            heappush(self._due_steps[channel], due_step)
+        bucket.append(event)
+
+    def pop_due(self, channel: str, step: int) -> list:
+        """
+        Removes and returns the events of a channel that are due at or before
+        step. Earlier buckets come first; inside a bucket events keep the
+        order in which they were scheduled.
+        """
+        buckets = self._buckets[channel]
+        due_steps = self._due_steps[channel]
+        events = list()
+        while due_steps and due_steps[0] <= step:
+            events.extend(buckets.pop(heappop(due_steps)))
+        return events
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import os
+import json
+from collections import deque, Counter
+from typing import NamedTuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd                                                        # pandas is imported when a DataFrame is built.
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+
+
+class Event(NamedTuple):
+    step: int
+    level: int
+    kind: str                                                                  # e.g. 'step', 'debt_revision', 'default', 'bankruptcy', 'scf_sale', 'error'
+    agent_id: object = None
+    value: float = None
+    message: str = ''
+
+
+class EventLog:
+    """
+    The events of a model run. Events below level are dropped; the callers in
+    Evolve test self.events.level before building an event, so a disabled
+    level costs one comparison. Kept events go to a ring buffer of the last
+    capacity events or, with a path, to a file of JSON lines written through
+    a large buffer. Events at or above echo_level are printed as well.
+    Either way they can be queried after the run. The kept events are not
+    part of the pickled state, so they do not grow snapshots and checkpoints:
+    a restored log starts with an empty buffer, and a log with a path goes on
+    appending to its file.
+    """
+    def __init__(self, level: int = INFO, capacity: int = 100000, path: str = None, echo_level: int = ERROR):
+        """
+        constructor
+         Input:
+           level: lowest level kept (DEBUG, INFO, WARNING or ERROR).
+           capacity: number of events kept in memory when there is no path.
+           path: optional file the events are appended to instead.
+           echo_level: lowest level printed; None prints nothing.
+        """
+        self.level = level
+        self.echo_level = echo_level
+        self.path = path
+        self._buffer = deque(maxlen = capacity)
+        self._file = None
+
+    def __getstate__(self) -> dict:
+        self.flush()
+        state = self.__dict__.copy()
+        state['_buffer'] = deque(maxlen = self._buffer.maxlen)                 # Settings only; the events stay here or in the file.
+        state['_file'] = None                                                  # Reopened in append mode when needed.
+        return state
+
+    def emit(self, step: int, level: int, kind: str, agent_id = None, value: float = None, message: str = '') -> None:
+        """
+        Records an event, if level is kept.
+        """
+        if level < self.level:
+            return
+        event = Event(step, level, kind, agent_id, value, message)
+        if self.path is None:
+            self._buffer.append(event)
+        else:
+            if self._file is None:
+                self._file = open(self.path, 'a', buffering = 1 << 20)
+            self._file.write(json.dumps(event, default = str) + '\n')
+        if self.echo_level is not None and level >= self.echo_level:
+            print(f'step {step} {LEVEL_NAMES.get(level, level)} {kind}' + (f' agent {agent_id}' if agent_id is not None else '') + (f': {message}' if message else ''))
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def truncate(self, step: int) -> None:
+        """
+        Drops the kept events after step, e.g. the ones written after the
+        checkpoint a run resumes from, which the resumed run emits again. A
+        line cut short by a killed process is dropped as well.
+        """
+        while self._buffer and self._buffer[-1].step > step:
+            self._buffer.pop()
+        if self.path is None or not os.path.exists(self.path):
+            return
+        self.close()
+        with open(self.path, 'rb+') as file:
+            offset = 0
+            for line in file:                                                  # Lines are JSON lists that start with the step, in step order.
+                if not line.endswith(b'\n') or int(line[1:line.index(b',')]) > step:
+                    break
+                offset += len(line)
+            file.truncate(offset)
+
+    def events(self) -> list:
+        """
+        All kept events, oldest first.
+        """
+        if self.path is None:
+            return list(self._buffer)
+        self.flush()
+        if not os.path.exists(self.path):
+            return list()
+        with open(self.path) as file:
+            return [Event(*json.loads(line)) for line in file]
+
+    def query(self, kind: str = None, level: int = None, agent_id = None, first_step: int = None, last_step: int = None) -> list:
+        """
+        The kept events matching every given criterion; level selects the
+        events at or above it.
+        """
+        return [event for event in self.events()
+                if (kind is None or event.kind == kind)
+                and (level is None or event.level >= level)
+                and (agent_id is None or event.agent_id == agent_id)
+                and (first_step is None or event.step >= first_step)
+                and (last_step is None or event.step <= last_step)]
+
+    def counts(self) -> Counter:
+        """
+        Number of kept events of each kind.
+        """
+        return Counter(event.kind for event in self.events())
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The kept events as a DataFrame with one row per event.
+        """
+        import pandas as pd
+        df = pd.DataFrame(self.events(), columns = Event._fields)
+        df['level'] = df['level'].map(LEVEL_NAMES)
+        return df
@@ -1,12 +1,36 @@
-from random import shuffle
-from operator import itemgetter
+import gc
+import io
+import os
+import math
+import time
+import zlib
+import pickle
+import tempfile
 from collections import Counter
 from statistics import mean
-import scipy.stats as stats
 import numpy as np
-from numpy import diff, log
 from sclib.recorder import Recorder
-from sclib.order import Order_Package
+from sclib.order import Order_Package, OrderBook
+from sclib.event_calendar import EventCalendar
+from sclib.ledger import TradeCreditLedger
+from sclib.discount import DiscountTables, Loan
+from sclib.vectorized import AgentArrays
+from sclib.history import StreamingHistoryStore
+from sclib.draws import StepDraws
+from sclib.price_index import PriceIndex
+from sclib.checkpoint import Checkpointer, OrderList, Segments, SnapshotPickler, SnapshotUnpickler
+from sclib.profiler import PhaseProfiler, CountingLookup
+from sclib.events import EventLog, DEBUG, INFO, WARNING, ERROR
+
+class SimulationError(RuntimeError):
+    """
+    Raised in strict mode by the first phase of Evolve.proceed() that fails;
+    the original exception is its __cause__.
+    """
+    def __init__(self, phase: str, step: int, error: Exception):
+        RuntimeError.__init__(self, f'{phase} failed at step {step}: {error!r}')
+        self.phase = phase
+        self.step = step
 
 class Evolve(Recorder):
     """
@@ -18,21 +42,40 @@ class Evolve(Recorder):
     random_node_level_disruption: bool
     seeding: bool
 
-    def __init__(self, list_agents: list):
+    random_streams = ('prices', 'demand', 'debt', 'shuffle')                  # One numpy.random.Generator per stochastic phase.
+
+    def __init__(self, list_agents: list, seed = None):
         """
         constructor
          Input:
            Agents_object: an object of Agents class.
+           seed: an int or a numpy.random.SeedSequence the random streams of
+                 the model are spawned from; None draws fresh entropy.
         """        
         Recorder.__init__(self, list_agents)
         self.list_orders = list()
+        self.order_book = OrderBook()
+        self.calendar = EventCalendar()
+        self.ledger = TradeCreditLedger(self.calendar)
+        self.discount = DiscountTables(self._year)
         self.next_agent_id = len(list_agents)
+        self.next_order_number = 1                                             # Per model, so runs in one process do not share a counter.
 
         self._wcap_financing = False
         self._SC_financing = False
         self._do_shuffle = False
         self._node_level_disruption = False
-        self._seeding = False
+        self._seeding = seed is not None
+        self.seed(seed)
+        self._vectorized = False
+        self.agent_arrays = None
+        self._streaming = False
+        self._debug = False
+        self._strict = False
+        self.checkpointer = None
+        self.profiler = None
+        self.events = EventLog()                                               # Replace with an EventLog of another level, capacity or path.
+        self._rated = None                                                     # (step, agents, default probabilities) of the last credit rating.
 
     def __lt__(self, object) -> bool:
         """
@@ -73,19 +116,34 @@ class Evolve(Recorder):
         if self._node_level_disruption:
             self._node_level_disruption = False
 
+    def seed(self, seed = None) -> None:
+        """
+        Spawns the random streams of the model from seed (an int or a
+        numpy.random.SeedSequence; None draws fresh entropy). Every stochastic
+        phase draws from its own stream in self.rngs, so a change in one phase
+        (e.g. shuffling turned on) leaves the draws of the others untouched.
+        """
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rngs = {stream: np.random.default_rng(child) for (stream, child) in zip(self.random_streams, self.seed_sequence.spawn(len(self.random_streams)))}
+        block_steps = self.draws.block_steps if hasattr(self, 'draws') else 1
+        self.draws = StepDraws(self.list_agents, self.rngs['prices'], self.rngs['demand'], block_steps)
+
     def turn_off_seeding(self) -> None:
         """
-        Sets the seeding flag of the model to its default state which is False.
+        Sets the seeding flag of the model to its default state which is False
+        and reseeds the model from fresh entropy.
         """
         if self._seeding:
             self._seeding = False
+            self.seed(None)
 
-    def turn_on_seeding(self) -> None:
+    def turn_on_seeding(self, seed: int = 0) -> None:
         """
-        Sets a np.random.seed() method on the model.
+        Reseeds the random streams of the model from seed, so the following
+        steps can be reproduced.
         """
-        if not self._seeding:
-            self._seeding = True
+        self._seeding = True
+        self.seed(seed)
 
     def activate_wcap_financing(self) -> None:
         """
@@ -115,6 +173,206 @@ class Evolve(Recorder):
         if self._SC_financing:
             self._SC_financing = False
 
+    def activate_debug_mode(self) -> None:
+        """
+        Recomputes inventory_value, receivables_value and payables_value from
+        the open items every step and raises if the running aggregates have
+        drifted from them.
+        """
+        if not self._debug:
+            self._debug = True
+
+    def deactivate_debug_mode(self) -> None:
+        if self._debug:
+            self._debug = False
+
+    def activate_strict_mode(self) -> None:
+        """
+        Stops proceed() at the first exception, raising a SimulationError
+        with the failing phase and step, instead of printing it and moving
+        on to the next step.
+        """
+        if not self._strict:
+            self._strict = True
+
+    def deactivate_strict_mode(self) -> None:
+        if self._strict:
+            self._strict = False
+
+    def activate_checkpointing(self, directory: str, every_steps: int = None, every_seconds: float = 600, keep: int = 2) -> None:
+        """
+        Writes a snapshot of the model to directory after every every_steps
+        steps and whenever every_seconds seconds have passed since the last
+        one (either may be None), keeping the keep latest files. A killed run
+        continues with Evolve.resume(directory). proceed() records the time
+        spent on checkpoints as a 'checkpoint' event when it returns.
+        """
+        if self._streaming:
+            raise ValueError('activate_checkpointing: the streaming history cannot be checkpointed')
+        self.checkpointer = Checkpointer(directory, every_steps, every_seconds, keep)
+
+    def deactivate_checkpointing(self) -> None:
+        self.checkpointer = None
+
+    def activate_profiling(self) -> None:
+        """
+        Records the wall time of every phase of proceed() in self.profiler, a
+        PhaseProfiler, with the orders scanned, ledger items touched, loans
+        opened and find_agent_by_id calls of each phase. When profiling is off
+        the phases only test that self.profiler is None.
+        """
+        if self.profiler is None:
+            self.profiler = PhaseProfiler()
+            self.order_book.profiler = self.ledger.profiler = self.profiler
+            self.find_agent_by_id = CountingLookup(self, self.profiler)
+
+    def deactivate_profiling(self) -> None:
+        """
+        Stops profiling and drops the records; read them from self.profiler
+        before.
+        """
+        if self.profiler is not None:
+            self.profiler = self.order_book.profiler = self.ledger.profiler = None
+            del self.find_agent_by_id
+
+    def activate_vectorized_engine(self) -> None:
+        """
+        Runs the numeric per-agent phases (balance sheets, credit ratings,
+        interest rates, credit and reverse factoring availability and
+        production capacity) as whole-array operations. Each of these phases
+        gathers the fields it needs from the agents into NumPy columns and
+        scatters its results back (see sclib.vectorized.AgentArrays), so the
+        agents keep their attributes up to date. A seeded run follows exactly
+        the same trajectories as with the default object engine.
+        """
+        if not self._vectorized:
+            self.agent_arrays = AgentArrays(self.list_agents)
+            self._vectorized = True
+
+    def deactivate_vectorized_engine(self) -> None:
+        """
+        Copies the asset volatility windows back into the agents and returns to
+        the object engine.
+        """
+        if self._vectorized:
+            self.agent_arrays.release()
+            self.agent_arrays = None
+            self._vectorized = False
+
+    def activate_draw_blocks(self, block_steps: int = 64) -> None:
+        """
+        Draws the selling prices and consumer demands of block_steps steps at
+        once. The draws, and so the trajectories of a seeded run, are the same
+        as when drawing step by step.
+        """
+        if block_steps < 1:
+            raise ValueError(f'activate_draw_blocks: block_steps = {block_steps} must be at least 1')
+        self.draws.block_steps = block_steps
+
+    def deactivate_draw_blocks(self) -> None:
+        """
+        Goes back to drawing the random inputs step by step.
+        """
+        self.draws.block_steps = 1
+
+    def activate_streaming_history(self, directory: str = None, flush_steps: int = 256) -> None:
+        """
+        Replaces the in-memory history with a StreamingHistoryStore that writes
+        the per-step metrics to files in directory every flush_steps steps, so
+        the memory of long runs stays bounded; the log_* DataFrames become
+        memory-mapped views on those files. A temporary directory is created
+        when none is given; it is not removed afterwards. The model must not
+        have been run yet and agents cannot be added while it is active.
+        """
+        if self._streaming:
+            return
+        if self.checkpointer is not None:
+            raise ValueError('activate_streaming_history: the streaming history cannot be checkpointed')
+        if self.current_step:
+            raise ValueError(f'activate_streaming_history: the model has already run {self.current_step} steps')
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix = 'sclib_history_')
+        self.history = StreamingHistoryStore(directory, self.history.n_agents, self.history.fill_values, flush_steps)
+        self._streaming = True
+
+    def deactivate_streaming_history(self) -> None:
+        """
+        Loads the history written so far back into memory.
+        """
+        if self._streaming:
+            self.history = self.history.to_memory(self.current_step)
+            self._streaming = False
+
+    def snapshot(self, history: bool = True, stored_orders: set = None, stored_loans: dict = None) -> bytes:
+        """
+        The complete state of the model (agents, orders, calendar, ledger,
+        random streams and history) pickled and compressed. Evolve.restore()
+        turns it into an independent model that continues exactly where this
+        one stands, e.g. to branch scenarios after a common burn-in. Only the
+        steps run so far are taken from the preallocated history.
+
+        A Checkpointer, which writes the growing parts of the state to
+        segments, leaves them out: with history = False no steps are taken,
+        only the record counts, the orders whose id() is in stored_orders are
+        pickled as references to their order_number and the first
+        stored_loans[agent_id] loans of each financing_history are dropped.
+        """
+        if self._streaming:
+            raise ValueError('snapshot: the streaming history is on disk and cannot be part of a snapshot')
+        (store, orders, archived_orders) = (self.history, self.list_orders, self.order_book.archived_orders)
+        self.history = store.head(self.current_step if history else 0)
+        if stored_orders:
+            (self.list_orders, self.order_book.archived_orders) = (OrderList(orders), OrderList(archived_orders))
+        enabled = gc.isenabled()
+        gc.disable()                                                           # Collections triggered by the pickler's tuples would rescan the whole model.
+        try:
+            buffer = io.BytesIO()
+            SnapshotPickler(buffer, stored_orders or set(), stored_loans or dict()).dump(self)
+            return zlib.compress(buffer.getbuffer(), 1)                        # Fast level; the history arrays compress well anyway.
+        finally:
+            (self.history, self.list_orders, self.order_book.archived_orders) = (store, orders, archived_orders)
+            if enabled:
+                gc.enable()
+
+    @staticmethod
+    def restore(data: bytes, stored: Segments = None) -> 'Evolve':
+        """
+        Rebuilds a model from the bytes of snapshot(); stored holds what a
+        checkpoint left out (see Checkpointer.read_segments()).
+        """
+        return SnapshotUnpickler(io.BytesIO(zlib.decompress(data)), stored or Segments(dict(), dict(), list())).load()
+
+    @classmethod
+    def resume(cls, path: str) -> 'Evolve':
+        """
+        Restores the model from a checkpoint file, or from the latest
+        checkpoint of a directory. Proceeding with the remaining steps gives
+        the same run as if it had not been interrupted. The history, archived
+        orders and loans are read back from the segments next to the
+        checkpoint. The events written to the file of the event log after the
+        checkpoint are dropped, since the resumed run emits them again.
+        """
+        if os.path.isdir(path):
+            path = Checkpointer.latest(path)
+        stored = Checkpointer.read_segments(os.path.dirname(path), Checkpointer.step(path))
+        with open(path, 'rb') as file:
+            model = cls.restore(file.read(), stored)
+        for (first_step, rows) in stored.history:
+            model.history.fill(first_step, rows)
+        model.events.truncate(model.current_step)
+        return model
+
+    def register_agent(self, agent) -> None:
+        """
+        Adds a new agent to the running model and advances next_agent_id, so
+        the next agent created for the model gets a free id.
+        """
+        Recorder.register_agent(self, agent)
+        self.next_agent_id = max(self.next_agent_id, agent.agent_id + 1)
+        self.draws.invalidate()
+        if self._vectorized:
+            self.agent_arrays.add(agent)
+
     def __break_list(self) -> None:
         """
         Creates lists of retailers, manufacturers and suppliers. 
@@ -129,117 +387,142 @@ class Evolve(Recorder):
                          agent.role == agent.supplier]
 
     def N(self, x):
-        return stats.norm.cdf(x)
+        """
+        Standard normal cdf; x can be a scalar or an array. scipy is imported
+        on the first call rather than with the model, so importing sclib.evolve
+        needs only numpy.
+        """
+        from scipy.special import ndtr
+        return ndtr(x)
 
     def credit_calculations(self):
         """
         This method calculates agent's distance to default and default probability
         using the calculate_assets_and_sigma_assets method to estimate market value
-        of assets and sigma assets.
-        """
-        for agent in self.list_agents:
-            if agent.bankruptcy:
-                continue
-            else:
-                agent.distance_to_default = (agent.total_assets - agent.total_liabilities) / (agent.total_assets * agent.sigma_assets)
-                agent.default_probability = self.N(-agent.distance_to_default)
-                agent.default_probability_history.append((agent.default_probability, self.current_step))
+        of assets and sigma assets. The active agents are rated in one batch and
+        their default probabilities recorded in self.history.
+        """
+        if self._vectorized:
+            self.agent_arrays.credit_calculations(self.current_step, self.N, self.history)
+            return
+
+        agents = [agent for agent in self.list_agents if not agent.bankruptcy]
+        n = len(agents)
+        total_assets = np.fromiter((agent.total_assets for agent in agents), float, n)
+        total_liabilities = np.fromiter((agent.total_liabilities for agent in agents), float, n)
+        sigma_assets = np.fromiter((agent.sigma_assets for agent in agents), float, n)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            distance_to_default = (total_assets - total_liabilities) / (total_assets * sigma_assets)
+        default_probability = self.N(-distance_to_default)
+        for (agent, dd, dp) in zip(agents, distance_to_default.tolist(), default_probability.tolist()):
+            agent.distance_to_default = dd
+            agent.default_probability = dp
+        self.history.record('default_probability', self.current_step, [agent.agent_id for agent in agents], default_probability)
+        self._rated = (self.current_step, agents, default_probability)
 
     def calculate_agent_interest_rate(self):
         """
         After credit rating of the agent, the short term financing needs to be
         calculated accordingly.
         """
-        for agent in self.list_agents:
-            if agent.bankruptcy:
-                continue
-            else:
-                new_rate = agent.default_probability + agent.interest_rate_margin
-                agent.interest_rate = agent.risk_free_rate + agent.interest_rate_margin if new_rate <= agent.risk_free_rate else new_rate
+        if self._vectorized:
+            self.agent_arrays.calculate_interest_rates()
+            return
+
+        if self._rated is not None and self._rated[0] == self.current_step:   # Reuses the batch of credit_calculations().
+            (_, agents, default_probability) = self._rated
+        else:
+            agents = [agent for agent in self.list_agents if not agent.bankruptcy]
+            default_probability = np.fromiter((agent.default_probability for agent in agents), float, len(agents))
+        margin = np.fromiter((agent.interest_rate_margin for agent in agents), float, len(agents))
+        risk_free_rate = np.fromiter((agent.risk_free_rate for agent in agents), float, len(agents))
+        new_rate = default_probability + margin
+        interest_rate = np.where(new_rate <= risk_free_rate, risk_free_rate + margin, new_rate)
+        for (agent, rate) in zip(agents, interest_rate.tolist()):
+            agent.interest_rate = rate
 
     def check_receivables_and_payables(self):
         """
         This method check payables and receivables due date. If any accounts are
         due at the current step of the model, they will be handeled here.
+        Accounts are filed in self.calendar by self.ledger, so only the ones
+        that are due are visited. An account whose counterparty is in default
+        or bankrupt is left on the books but not rescheduled: neither state is
+        ever left in this model.
+        """
+        for (agent, account, invoice_id) in self.calendar.pop_due(EventCalendar.settlement, self.current_step):
+            entry = getattr(agent, account).get(invoice_id)
+            if agent.bankruptcy or entry is None:
+                continue
+
+            if account == 'receivables':                                       # receivables are Invoice(amount, due_date, buyer_id)
+                if entry.counterparty != 'outside':
+                    buyer = self.find_agent_by_id(entry.counterparty)
+                    if buyer.in_default or buyer.bankruptcy:
+                        continue
+                agent.working_capital += entry.amount
+            else:                                                              # payables Invoice(amount, due_date, seller_id) and scheduled_money_payment BankPayment(amount, due_date)
+                if agent.in_default:
+                    continue
+                agent.working_capital -= entry.amount
+            self.ledger.settle(agent, account, invoice_id)
+
+    def sell_receivables(self, agent) -> None:
         """
-        for sup in self.sup_list:
-            if sup.receivables and not sup.bankruptcy:
-                for tup in sup.receivables:                                    # sup.receivables is a list of tuples in the form [(val, due_date, ds_id)]
-                    man = self.find_agent_by_id(tup[2])
-                    if tup[1] <= self.current_step and not man.in_default and not man.bankruptcy:
-                        sup.working_capital += tup[0]
-                        sup.receivables.remove(tup)
-
-        for man in self.man_list:
-            if man.receivables and not man.bankruptcy:
-                for tup in man.receivables:                                    # man.receivables is a list of tuples in the form [(val, due_date, ds_id)]
-                    ret = self.find_agent_by_id(tup[2])
-                    if tup[1] <= self.current_step and not ret.in_default and not ret.bankruptcy:
-                        man.working_capital += tup[0]
-                        man.receivables.remove(tup)
-
-            if man.payables:
-                for tup in man.payables:                                       # man.payables is a list of tuples in the form [(val, due_date, us_id)]
-                    if tup[1] <= self.current_step and not man.in_default:
-                        man.working_capital -= tup[0]
-                        man.payables.remove(tup)
-
-            if man.scheduled_money_payment:
-                for tup in man.scheduled_money_payment:
-                    if tup[1] <= self.current_step and not man.in_default:
-                        man.working_capital -= tup[0]
-                        man.scheduled_money_payment.remove(tup)
+        Sells agent.RF_eligible_contracts through reverse factoring. Each
+        receivable is sold once: the contracts and SCF_capacity are cleared, so
+        a later order of the same step cannot sell them again.
+        """
+        if self.events.level <= INFO:
+            self.events.emit(self.current_step, INFO, 'scf_sale', agent.agent_id, agent.SCF_capacity,
+                             f'{len(agent.RF_eligible_contracts)} receivables sold')
+        for invoice_id in agent.RF_eligible_contracts:
+            buyer = self.find_agent_by_id(agent.receivables[invoice_id].counterparty)
+            self.ledger.factor(agent, buyer, invoice_id, agent.RF_ratio)
+        agent.RF_eligible_contracts = list()
+        agent.SCF_capacity = 0
 
-        for ret in self.ret_list:
-            if ret.receivables and not ret.bankruptcy:
-                for tup in ret.receivables:
-                    if tup[1] <= self.current_step:
-                        ret.working_capital += tup[0]
-                        ret.receivables.remove(tup)
-
-            if ret.payables:
-                for tup in ret.payables:
-                    if tup[1] <= self.current_step and not ret.in_default:
-                        ret.working_capital -= tup[0]
-                        ret.payables.remove(tup)
-
-            if ret.scheduled_money_payment:
-                for tup in ret.scheduled_money_payment:
-                    if tup[1] <= self.current_step and not ret.in_default:
-                        ret.working_capital -= tup[0]
-                        ret.scheduled_money_payment.remove(tup)
+    def release_inventory(self, agent) -> None:
+        """
+        Removes the inventory items of a delivering agent that are due by now.
+        Items are appended with due_date = current_step + production_time, so
+        inventory_track is sorted by due date and the due items form a prefix.
+        """
+        track = agent.inventory_track
+        released = 0
+        while released < len(track) and track[released][1] <= self.current_step:
+            agent.inventory_value -= track[released][0]
+            released += 1
+        del track[:released]
+        if not track:
+            agent.inventory_value = 0.0                                        # Clears the rounding error of the running total.
+
+    def stock_inventory(self, agent, value: float, due_date: int) -> None:
+        """
+        Adds an item to the inventory_track of agent and to its inventory_value.
+        """
+        agent.inventory_track.append((value, due_date))
+        agent.inventory_value += value
 
     def calculate_inventory_receivable_payable_values(self):
         """
-        This method calculates inventory value at the current step
+        inventory_value, receivables_value and payables_value are running
+        totals kept by stock_inventory, release_inventory and self.ledger. In
+        debug mode this method recomputes them from the open items and raises
+        if they disagree.
         """
+        if not self._debug:
+            return
+
         for agent in self.list_agents:
             if agent.bankruptcy:
                 continue
-            else:
-                if not agent.inventory_track:                                      # Calculating inventory value
-                    agent.inventory_value = 0
-                else:
-                    cur_inv = 0
-                    for (val,due_date) in agent.inventory_track:
-                        cur_inv += val
-                    agent.inventory_value = cur_inv
-    
-                if not agent.receivables:                                          # Calculating receivables value
-                    agent.receivables_value = 0
-                else:
-                    cur_rec = 0
-                    for (val, due_date, _) in agent.receivables:
-                        cur_rec += val
-                    agent.receivables_value = cur_rec
-                    
-                if not agent.payables:                                             # Calculating payables value
-                    agent.payables_value = 0
-                else:
-                    cur_pay = 0
-                    for (val, due_date, _) in agent.payables:
-                        cur_pay += val
-                    agent.payables_value = cur_pay
+            for (name, items) in (('inventory_value', agent.inventory_track),
+                                  ('receivables_value', agent.receivables.values()),
+                                  ('payables_value', agent.payables.values())):
+                expected = sum(item[0] for item in items)
+                if not math.isclose(getattr(agent, name), expected, rel_tol = 1e-9, abs_tol = agent.abs_tol):
+                    raise ValueError(f'calculate_inventory_receivable_payable_values: {name} of agent {agent.agent_id} is {getattr(agent, name)}, open items add up to {expected}')
 
     def periodic_long_term_debt_revision(self):
         """
@@ -249,52 +532,43 @@ class Evolve(Recorder):
                 long_term_debt_value = agent.long_term_debt
                 low = long_term_debt_value * (1 - agent.ltd_volatility)
                 high = long_term_debt_value * (1 + agent.ltd_volatility)
-                new_long_term_debt_value = np.random.uniform(low, high)
+                new_long_term_debt_value = self.rngs['debt'].uniform(low, high)
                 agent.long_term_debt = new_long_term_debt_value
-                print(f'long term debt revised for agent {agent.agent_id} at step {self.current_step}')
+                if self.events.level <= DEBUG:
+                    self.events.emit(self.current_step, DEBUG, 'debt_revision', agent.agent_id, new_long_term_debt_value)
 
     def update_total_assets_and_liabilities_and_equity(self):
         """
         The value of total_assets, total liabilities and equity of each agent is
         calculated by this method at the beginning of each step.
         """
-        for agent in self.list_agents:
-            if not agent.bankruptcy:
-                agent.total_assets = agent.working_capital + agent.fixed_assets + agent.inventory_value + agent.receivables_value
-                agent.list_assets.append(agent.total_assets)
-                agent.total_assets_history.append((agent.total_assets, self.current_step))
-                agent.total_liabilities = agent.liability + agent.payables_value + agent.long_term_debt
-                agent.total_liabilities_history.append((agent.total_liabilities, self.current_step))
-                agent.equity = agent.total_assets - agent.total_liabilities
-                agent.list_equity.append(agent.equity)
-                agent.equity_history.append((agent.equity, self.current_step))
-
-                if self.current_step > self._credit_rating_step:
-                    daily_log_return_list = diff(log(agent.list_assets))
-                    yearly_log_return_list = list()
-                    for i in range(len(daily_log_return_list) - self._half_year):
-                        yearly_log_return_list.append(sum(daily_log_return_list[i:i + self._half_year]))
-                    agent.sigma_assets = np.std(yearly_log_return_list)
+        if self._vectorized:
+            self.agent_arrays.update_balance_sheet(self.current_step, self.current_step > self._credit_rating_step, self.history)
+            return
+
+        agents = [agent for agent in self.list_agents if not agent.bankruptcy]
+        for agent in agents:
+            agent.total_assets = agent.working_capital + agent.fixed_assets + agent.inventory_value + agent.receivables_value
+            agent.asset_volatility.push(agent.total_assets)
+            agent.total_liabilities = agent.liability + agent.payables_value + agent.long_term_debt
+            agent.equity = agent.total_assets - agent.total_liabilities
+
+            if self.current_step > self._credit_rating_step:
+                agent.sigma_assets = agent.asset_volatility.sigma
+
+        ids = [agent.agent_id for agent in agents]
+        self.history.record('total_assets', self.current_step, ids, [agent.total_assets for agent in agents])
+        self.history.record('total_liabilities', self.current_step, ids, [agent.total_liabilities for agent in agents])
+        self.history.record('equity', self.current_step, ids, [agent.equity for agent in agents])
 
     def calculate_duration_of_obligations(self):
         """
         Calculates the duration of all remaining loan obligations of the agent.
+        Only the loans that are not due yet are kept in agent.open_loans, which
+        updates the sums behind the duration as loans are taken and mature.
         """
         for agent in self.list_agents:
-            l = list()
-            if agent.financing_history:
-                for (amount, _, due_date) in agent.financing_history:
-                    if due_date > self.current_step:
-                        l.append((amount, due_date - self.current_step))
-                present_value = [(amount * (1 / (1 + (agent.financing_rate/ self._year)) ** remaining_time), remaining_time) for (amount, remaining_time) in l ]
-                pv_of_total_obligations = sum(i for i, _ in present_value)
-                if pv_of_total_obligations != 0:
-                    timed_obligations = sum(i * j for i, j in present_value)
-                    agent.duration_of_obligations = timed_obligations / pv_of_total_obligations
-                else:
-                    agent.duration_of_obligations = 1
-            else:
-                agent.duration_of_obligations = 1
+            agent.duration_of_obligations = agent.open_loans.duration(self.current_step, agent.financing_rate, self.discount)
 
     def check_reverse_factoring_availability(self):
         """
@@ -302,35 +576,30 @@ class Evolve(Recorder):
         is any sellable that can be sold. The important feature that makes a 
         receivable sellable is the better credit rating of downstream partners.
         """
+        if self._vectorized:
+            self.agent_arrays.check_reverse_factoring_availability(self.ledger)
+            return
+
         eligable_agents = [agent for agent in self.list_agents if agent.role == 's' or agent.role == 'm']
         for agent in eligable_agents:
-            agent.SCF_availability = False
-            if not agent.receivables:
-                continue
-            else:
-                sellable_receivables = 0
-                for (_, _, buyer_id) in agent.receivables:
-                    buyer = self.find_agent_by_id(buyer_id)
-                    if buyer.default_probability < agent.default_probability:
-                        sellable_receivables += 1
-                if sellable_receivables >= 1:
-                    agent.SCF_availability = True
+            agent.SCF_availability = any(self.find_agent_by_id(buyer_id).default_probability < agent.default_probability
+                                         for buyer_id in self.ledger.buyers(agent))    # One lookup per buyer, not per receivable.
 
     def check_credit_availability(self):
         """
         This method takes into account the time gaps between financing and credit capacity 
         considerations to determine whether an agent can seek financing or not.
         """
+        if self._vectorized:
+            self.agent_arrays.check_credit_availability(self.current_step, self.history)
+            return
+
         for agent in self.list_agents:
             if self.current_step >= agent.time_of_next_allowed_financing and agent.liability < agent.total_credit_capacity and not agent.bankruptcy:
                 agent.credit_availability = True
-                if len(agent.list_working_capital) > agent.days_between_financing:
+                if self.history.counts['working_capital'][agent.agent_id] > agent.days_between_financing:
                     members = agent.days_between_financing
-                    tuplist = list()
-                    intlist = list()
-                    listt = agent.list_working_capital
-                    tuplist = listt[-members:]
-                    intlist = [val for val,_ in tuplist]
+                    intlist = self.history.recent('working_capital', agent.agent_id, self.current_step - 1, members).tolist()
                     agent.total_credit_capacity = mean(intlist)
                 else:
                     agent.total_credit_capacity = 100
@@ -352,37 +621,51 @@ class Evolve(Recorder):
         Production capacity of each agent is determined in this method by 
         considering its working capital and possible financing values.
         """
+        if self._vectorized:
+            self.agent_arrays.determine_capacity(self._wcap_financing, self._SC_financing, self._year, self.calculate_SCF_capacity)
+            return
+
         for agent in self.list_agents:
             agent.SCF_capacity = 0
             agent.RF_eligible_contracts = list()
             price_mean = agent.mu_selling_price + 0.1
             if self._wcap_financing and agent.credit_availability and self._SC_financing and agent.SCF_availability and not agent.bankruptcy:
-                for (amount, due_date, buyer_id) in agent.receivables:
-                    buyer = self.find_agent_by_id(buyer_id)
-                    if buyer.default_probability < agent.default_probability:
-                        agent.RF_eligible_contracts.append((amount, due_date, buyer_id))
-                for (amount, due_date, buyer_id) in agent.RF_eligible_contracts:
-                    discounted_amount = (amount / (1 + (buyer.interest_rate/self._year)) ** (due_date - self.current_step))
-                    feasible_amount = discounted_amount * agent.RF_ratio
-                    agent.SCF_capacity += feasible_amount
-
-                agent.prod_cap = max(0, (agent.working_capital + agent.current_credit_capacity * (1 / (1 + (agent.financing_rate / self._year)) ** agent.financing_period) + agent.SCF_capacity) / price_mean)
+                self.calculate_SCF_capacity(agent)
+                agent.prod_cap = max(0, (agent.working_capital + agent.current_credit_capacity * (1 / self.discount.growth(agent.financing_rate, agent.financing_period)) + agent.SCF_capacity) / price_mean)
             elif self._wcap_financing and agent.credit_availability and not self._SC_financing and not agent.bankruptcy:
-                agent.prod_cap = max(0, (agent.working_capital + agent.current_credit_capacity * (1 / (1 + (agent.financing_rate / self._year)) ** agent.financing_period)) / price_mean)
+                agent.prod_cap = max(0, (agent.working_capital + agent.current_credit_capacity * (1 / self.discount.growth(agent.financing_rate, agent.financing_period))) / price_mean)
             else:
                 agent.prod_cap = max(0, agent.working_capital / price_mean)
 
+    def calculate_SCF_capacity(self, agent) -> None:
+        """
+        Collects the invoice ids of the receivables of agent that can be sold
+        through reverse factoring in agent.RF_eligible_contracts and adds up
+        their feasible value in agent.SCF_capacity. Each receivable is
+        discounted at the interest rate of its own buyer.
+        """
+        for (buyer_id, invoice_ids) in self.ledger.buyers(agent).items():
+            buyer = self.find_agent_by_id(buyer_id)
+            if buyer.default_probability < agent.default_probability:
+                for invoice_id in invoice_ids:
+                    (amount, due_date, _) = agent.receivables[invoice_id]
+                    agent.RF_eligible_contracts.append(invoice_id)
+                    discounted_amount = (amount / self.discount.factor(buyer.interest_rate, due_date - self.current_step))
+                    feasible_amount = discounted_amount * agent.RF_ratio
+                    agent.SCF_capacity += feasible_amount
+
     def receive_order_by_retailers(self):
         """
         Retailers receive orders in different frequencies. In this method we 
         check to see if it is the time for agent to receive orders from costumers
         outside the supply chain.
         """
-        for ret in self.ret_list:
+        for (ret, rand_value) in self.draws.demand(self.current_step):
+            if ret.bankruptcy:
+                continue
             if ret.consumer_demand:
                 ret.consumer_demand = 0.0
-            if not self.current_step % ret.ordering_period and not ret.bankruptcy:
-                rand_value = np.random.exponential(scale = ret.consumer_demand_mean, size = 1)[0]
+            if not self.current_step % ret.ordering_period:
                 ret.consumer_demand = min(rand_value, ret.prod_cap)
 
     def create_order_object(self):
@@ -392,53 +675,63 @@ class Evolve(Recorder):
         """
         for ret in self.ret_list:
             if ret.consumer_demand and not ret.bankruptcy:
-                order_object = Order_Package(ret.consumer_demand, ret.agent_id, self.current_step, ret.selling_price)
+                order_object = Order_Package(ret.consumer_demand, ret.agent_id, self.current_step, ret.selling_price, self.next_order_number)
+                self.next_order_number += 1
                 self.list_orders.append(order_object)
+                self.order_book.add(order_object)
+
+    def price_index(self, role: str) -> PriceIndex:
+        """
+        The PriceIndex of the agents of a layer ('m' or 's') that can still
+        sell in the current step.
+        """
+        layer = self.man_list if role == 'm' else self.sup_list
+        sellers = [agent for agent in layer if agent.prod_cap > 0 and not agent.bankruptcy]
+        return PriceIndex(sellers, [agent.selling_price for agent in sellers])
 
     def order_to_manufacturers(self):
         """
         Ordering behavior of retailers.
         """
-        orders_to_go_up = [order for order in self.list_orders if 
-                            order.completed_ordering_to_manufacturers == False]
+        orders_to_go_up = self.order_book.stage(OrderBook.ordering_to_manufacturers)
         if self._do_shuffle:
-            shuffle(orders_to_go_up)                                             # Creates Competetion within stage.
+            self.rngs['shuffle'].shuffle(orders_to_go_up)               # Creates Competetion within stage.
+        manufacturers = self.price_index('m')
 
         for order in orders_to_go_up:
             remaining_order_amount = order.initial_order_amount
             retailer = self.find_agent_by_id(order.retailer_agent_id)
 
-            elig = [(agent.agent_id, agent.selling_price, agent.prod_cap) for agent in self.man_list if agent.prod_cap > 0 and agent.selling_price < retailer.selling_price and not agent.bankruptcy]
+            elig = manufacturers.below(retailer.selling_price)
             
             if not elig:
                 order.order_feasibility = False
+                self.order_book.archive(order)
                 continue
             
-            elig.sort(key = itemgetter(1))
-            
-            for (agent_id, selling_price, cap) in elig:
+            for position in elig:
                 if self.almost_equal_to_zero(remaining_order_amount, retailer.abs_tol):
                     break
-                manufacturer = self.find_agent_by_id(agent_id)
-                amount = min(cap, remaining_order_amount)
+                manufacturer = manufacturers.agents[position]
+                amount = min(manufacturer.prod_cap, remaining_order_amount)
                 manufacturer.prod_cap -= amount
-                order.manufacturers.append((agent_id, manufacturer.production_time, amount, manufacturer.selling_price))
+                order.manufacturers.append((manufacturer.agent_id, manufacturer.production_time, amount, manufacturer.selling_price))
                 # retailer.orders_succeeded += amount
                 remaining_order_amount -= amount
             
             order.completed_ordering_to_manufacturers = True
             order.num_manufacturers = len(order.manufacturers)
+            self.order_book.move(order, OrderBook.ordering_to_manufacturers, OrderBook.ordering_to_suppliers)
 
     def order_to_suppliers(self):
         """
         Ordering behavior of manufacturers.
         """
-        orders_to_go_up = [order for order in self.list_orders if 
-                           order.completed_ordering_to_manufacturers == True 
-                           and order.completed_ordering_to_suppliers == False]
+        orders_to_go_up = self.order_book.stage(OrderBook.ordering_to_suppliers)
 
         if self._do_shuffle:
-            shuffle(orders_to_go_up)                                             # Creates Competetion within stage.
+            self.rngs['shuffle'].shuffle(orders_to_go_up)               # Creates Competetion within stage.
+        suppliers = self.price_index('s')
 
         for order in orders_to_go_up:
             for order_tuple in order.manufacturers:
@@ -446,47 +739,35 @@ class Evolve(Recorder):
                 remaining_order_amount = order_tuple[2]
                 
 
-                elig = [(agent.agent_id, agent.selling_price, agent.prod_cap) for agent in self.sup_list if agent.prod_cap > 0 and agent.selling_price < manufacturer.selling_price and not agent.bankruptcy]
+                elig = suppliers.below(manufacturer.selling_price)
 
                 if not elig:
                     order.order_feasibility = False
                     continue
 
-                elig.sort(key = itemgetter(1))
-
-                for (agent_id, selling_price, cap) in elig:
+                for position in elig:
                     
                     if self.almost_equal_to_zero(remaining_order_amount, manufacturer.abs_tol):
                         break
 
-                    supplier = self.find_agent_by_id(agent_id)
-                    amount = min(cap, remaining_order_amount)
+                    supplier = suppliers.agents[position]
+                    amount = min(supplier.prod_cap, remaining_order_amount)
                     supplier.prod_cap -= amount
-                    order.suppliers.append((agent_id, amount, self.current_step + supplier.production_time, manufacturer.agent_id, supplier.selling_price))
+                    supplier_tuple = (supplier.agent_id, amount, self.current_step + supplier.production_time, manufacturer.agent_id, supplier.selling_price)
+                    order.suppliers.append(supplier_tuple)
+                    self.calendar.schedule(EventCalendar.delivery_to_manufacturer, supplier_tuple[2], (order, supplier_tuple))
                     # manufacturer.orders_succeeded += amount
                     remaining_order_amount -= amount
                     price_to_pay = (1 - supplier.input_margin) * amount
 
                     if amount > supplier.q * supplier.working_capital and self._wcap_financing and supplier.SCF_capacity:
 
-                        supplier.working_capital += supplier.SCF_capacity
-                        supplier.SCF_history.append((supplier.SCF_capacity, self.current_step))
-
-                        for tup1 in supplier.receivables:
-                            for tup2 in supplier.RF_eligible_contracts:
-                                if tup1 == tup2:
-                                    buyer = self.find_agent_by_id(tup1[2])
-                                    supplier.receivables.remove(tup1)
-                                    new_amount = tup2[0] * (1 - supplier.RF_ratio)
-                                    supplier.receivables.append((new_amount, tup2[1], tup2[2]))
-                                    for tup in buyer.payables:
-                                        if tup[0] == tup1[0] and tup[1] == tup1[1]:
-                                            pay_to_bank = tup[0] - new_amount
-                                            buyer.payables.remove(tup)
-                                            buyer.payables.append((new_amount, tup[1], tup[2]))
-                                            buyer.scheduled_money_payment.append((pay_to_bank, tup2[1]))
+                        SCF_value = supplier.SCF_capacity
+                        supplier.working_capital += SCF_value
+                        self.history.record('SCF', self.current_step, supplier.agent_id, SCF_value)
+                        self.sell_receivables(supplier)
                         
-                        excess_order = amount - (supplier.q * (supplier.working_capital + supplier.SCF_capacity))
+                        excess_order = amount - (supplier.q * (supplier.working_capital + SCF_value))
                         if excess_order > 0:
                             loan_amount = excess_order / supplier.q
                             self.short_term_financing(supplier.agent_id, loan_amount)
@@ -497,23 +778,28 @@ class Evolve(Recorder):
                         self.short_term_financing(supplier.agent_id, loan_amount)
                     
                     supplier.working_capital -= price_to_pay
-                    supplier.inventory_track.append((price_to_pay, self.current_step + supplier.production_time)) #When the agent pays for raw material, it is stored in inventory_track as the tuple (value,due_date)
+                    self.stock_inventory(supplier, price_to_pay, self.current_step + supplier.production_time) #When the agent pays for raw material, it is stored in inventory_track as the tuple (value,due_date)
 
                 order.completed_ordering_to_suppliers = True
 
+            if order.completed_ordering_to_suppliers:
+                self.order_book.move(order, OrderBook.ordering_to_suppliers, OrderBook.pairing)
+            else:                                                              # None of the manufacturers found a supplier.
+                self.order_book.archive(order)
+
     def calculate_order_partners(self):
         """
         Order objects with completed ordering flow are checked in this method to
         identify agents participating in the order object.
         """
-        completed_order_flow = [order for order in self.list_orders if order.completed_ordering_to_manufacturers == True 
-                                        and order.completed_ordering_to_suppliers == True 
-                                        and order.created_pairs == False]
+        completed_order_flow = self.order_book.stage(OrderBook.pairing)
         for order in completed_order_flow:
             for (supplier_id, _, _, manufacturer_id, _) in order.suppliers:
                 order.manufacturer_supplier_pairs.add((supplier_id, manufacturer_id))
 
             order.created_pairs = True
+            self.order_book.leave(order, OrderBook.pairing)
+            self.order_book.enter(order, OrderBook.planning_delivery_to_retailer)
 
             counter = Counter()
             for (_, man) in order.manufacturer_supplier_pairs:
@@ -525,83 +811,72 @@ class Evolve(Recorder):
                 else:
                     order.manufacturers_num_partners.append((man, counter[man]))
 
+            if order.manufacturers_num_partners:
+                self.order_book.enter(order, OrderBook.delivering_to_manufacturers)
+            else:                                                              # No supplier is involved, so there is nothing to wait for.
+                order.completed_delivering_to_manufacturers = True
+                self.order_book.enter(order, OrderBook.planning_delivery_by_retailer)
+
     def deliver_to_manufacturers(self):
         """
         Delivery behavior of suppliers.
         """
-        begin_delivery_flow = [order for order in self.list_orders if order.completed_ordering_to_manufacturers == True 
-                               and order.completed_ordering_to_suppliers == True 
-                               and order.created_pairs == True
-                               and order.completed_delivering_to_manufacturers == False]
-        for order in begin_delivery_flow:
-            for(supplier_agent_id, amount, delivery_step, manufacturer_agent_id, price) in order.suppliers:
-                if (supplier_agent_id, manufacturer_agent_id) not in order.manufacturer_supplier_pairs:
-                    raise Exception(f'There is something wrong with calculate_order_partners method; It is not making all pairs')
-                if delivery_step == self.current_step:
-                    supplier = self.find_agent_by_id(supplier_agent_id)
-                    manufacturer = self.find_agent_by_id(manufacturer_agent_id)
-
-                    step_income = price * amount            #Calculating profit using a fixed margin for suppliers
-                    # compounded_for_tc = step_income * (1 + (supplier.tc_rate / self._year))**supplier.payment_term   #Calculates the payment value under trade credit,
-                    supplier.receivables.append((step_income, self.current_step + supplier.payment_term, manufacturer_agent_id))# Addine TC to receivables.
-                    manufacturer.payables.append((step_income, self.current_step + supplier.payment_term, supplier_agent_id))# Adding TC to payables.
-                    # supplier.working_capital += step_income
-                    for tup in supplier.inventory_track:
-                        if tup[1] <= self.current_step:
-                            supplier.inventory_track.remove(tup)
-
-                    # price_to_pay = compounded_for_tc
-                    # manufacturer.working_capital -= price_to_pay
-                    manufacturer.inventory_track.append((step_income, self.current_step + manufacturer.production_time))
-
-                    for index, item in enumerate(order.manufacturers_num_partners):
-                        itemlist = list(item)
-                        if itemlist[0] == manufacturer_agent_id:
-                            itemlist[1] = itemlist[1] - 1
-                        item = tuple(itemlist)
-                        if item[1] == 0:
-                            order.manufacturers_num_partners.remove(order.manufacturers_num_partners[index])
-                        else:
-                            order.manufacturers_num_partners[index] = item
+        due_deliveries = self.calendar.pop_due(EventCalendar.delivery_to_manufacturer, self.current_step)
+        due_deliveries.sort(key = lambda event: event[0].order_number)          # Stable, so deliveries of one order keep their order.
+        for (order, (supplier_agent_id, amount, delivery_step, manufacturer_agent_id, price)) in due_deliveries:
+            if (supplier_agent_id, manufacturer_agent_id) not in order.manufacturer_supplier_pairs:
+                raise Exception(f'There is something wrong with calculate_order_partners method; It is not making all pairs')
+            supplier = self.find_agent_by_id(supplier_agent_id)
+            manufacturer = self.find_agent_by_id(manufacturer_agent_id)
+
+            step_income = price * amount            #Calculating profit using a fixed margin for suppliers
+            # compounded_for_tc = step_income * (1 + (supplier.tc_rate / self._year))**supplier.payment_term   #Calculates the payment value under trade credit,
+            self.ledger.issue(supplier, step_income, self.current_step + supplier.payment_term, buyer = manufacturer)    # Adding TC to receivables and payables.
+            # supplier.working_capital += step_income
+            self.release_inventory(supplier)
+
+            # price_to_pay = compounded_for_tc
+            # manufacturer.working_capital -= price_to_pay
+            self.stock_inventory(manufacturer, step_income, self.current_step + manufacturer.production_time)
+
+            for index, item in enumerate(order.manufacturers_num_partners):
+                itemlist = list(item)
+                if itemlist[0] == manufacturer_agent_id:
+                    itemlist[1] = itemlist[1] - 1
+                item = tuple(itemlist)
+                if item[1] == 0:
+                    order.manufacturers_num_partners.remove(order.manufacturers_num_partners[index])
+                else:
+                    order.manufacturers_num_partners[index] = item
             if not order.manufacturers_num_partners:
                 order.completed_delivering_to_manufacturers = True
+                self.order_book.move(order, OrderBook.delivering_to_manufacturers, OrderBook.planning_delivery_by_retailer)
 
     def plan_delivery_to_retailer(self):
         """
         Short  financing of manufacturers and payment to manufacturers
         are planned in this method.
         """
-        plan_delivery_list = [order for order in self.list_orders if order.completed_ordering_to_manufacturers == True 
-                              and order.completed_ordering_to_suppliers == True 
-                              and order.created_pairs == True]
+        plan_delivery_list = self.order_book.stage(OrderBook.planning_delivery_to_retailer)
         for order in plan_delivery_list:
             waiting_manufacturers = [manufacturer_agent_id for (manufacturer_agent_id, _) in order.manufacturers_num_partners]
             for (manufacturer_agent_id, manufacturer_production_time, amount, price) in order.manufacturers:
                 if manufacturer_agent_id not in waiting_manufacturers and manufacturer_agent_id not in order.planned_manufacturers:
-                    order.manufacturer_delivery_plan.append((manufacturer_agent_id, self.current_step + manufacturer_production_time, amount, price))
+                    plan = (manufacturer_agent_id, self.current_step + manufacturer_production_time, amount, price)
+                    order.manufacturer_delivery_plan.append(plan)
                     order.planned_manufacturers.append(manufacturer_agent_id)
+                    self.order_book.enter(order, OrderBook.delivering_to_retailer)
+                    self.calendar.schedule(EventCalendar.delivery_to_retailer, plan[1], (order, plan))
                     manufacturer = self.find_agent_by_id(manufacturer_agent_id)
 
                     if amount > manufacturer.q * manufacturer.working_capital and self._wcap_financing and manufacturer.SCF_capacity:
 
-                        manufacturer.working_capital += manufacturer.SCF_capacity
-                        manufacturer.SCF_history.append((manufacturer.SCF_capacity, self.current_step))
-
-                        for tup1 in manufacturer.receivables:
-                            for tup2 in manufacturer.RF_eligible_contracts:
-                                if tup1 == tup2:
-                                    buyer = self.find_agent_by_id(tup1[2])
-                                    manufacturer.receivables.remove(tup1)
-                                    new_amount = tup2[0] * (1 - manufacturer.RF_ratio)
-                                    manufacturer.receivables.append((new_amount, tup2[1], tup2[2]))
-                                    for tup in buyer.payables:
-                                        if tup[0] == tup1[0] and tup[1] == tup1[1]:
-                                            pay_to_bank = tup[0] - new_amount
-                                            buyer.payables.remove(tup)
-                                            buyer.payables.append((new_amount, tup[1], tup[2]))
-                                            buyer.scheduled_money_payment.append((pay_to_bank, tup2[1]))
+                        SCF_value = manufacturer.SCF_capacity
+                        manufacturer.working_capital += SCF_value
+                        self.history.record('SCF', self.current_step, manufacturer.agent_id, SCF_value)
+                        self.sell_receivables(manufacturer)
                         
-                        excess_order = amount - (manufacturer.q * (manufacturer.working_capital + manufacturer.SCF_capacity))
+                        excess_order = amount - (manufacturer.q * (manufacturer.working_capital + SCF_value))
                         if excess_order > 0:
                             loan_amount = excess_order / manufacturer.q
                             self.short_term_financing(manufacturer.agent_id, loan_amount)
@@ -611,54 +886,50 @@ class Evolve(Recorder):
                         loan_amount = excess_order / manufacturer.q
                         self.short_term_financing(manufacturer.agent_id, loan_amount)
 
+            if len(order.planned_manufacturers) == len(order.manufacturers):
+                self.order_book.leave(order, OrderBook.planning_delivery_to_retailer)
+
     def deliver_to_retailer(self):
         """
         Delivery behavior of manufacturer.
         """
-        possible_delivery_to_retailer = [order for order in self.list_orders if order.completed_ordering_to_manufacturers == True 
-                                         and order.completed_ordering_to_suppliers == True 
-                                         and order.created_pairs == True]
-        for order in possible_delivery_to_retailer:
-            if order.manufacturer_delivery_plan:
-                for (manufacturer_agent_id, delivery_step, amount, price) in order.manufacturer_delivery_plan:
-                    if delivery_step == self.current_step:
-                        retailer = self.find_agent_by_id(order.retailer_agent_id)
-                        manufacturer = self.find_agent_by_id(manufacturer_agent_id)
-
-                        step_income = (price * amount)
-                        # compounded_for_tc = step_income * (1 + (manufacturer.tc_rate / self._year))**manufacturer.payment_term
-                        manufacturer.receivables.append((step_income, self.current_step + manufacturer.payment_term, retailer.agent_id))
-                        retailer.payables.append((step_income, self.current_step + manufacturer.payment_term, manufacturer_agent_id))
-                        # manufacturer.working_capital += step_income
-                        for tup in manufacturer.inventory_track:
-                            if tup[1] <= self.current_step:
-                                manufacturer.inventory_track.remove(tup)
-
-                        # price_to_pay = compounded_for_tc
-                        # retailer.working_capital -= price_to_pay
-                        retailer.inventory_track.append((step_income, self.current_step + retailer.production_time))
-
-                        order.amount_delivered_to_retailer += amount
-
-                        for index, item in enumerate(order.manufacturer_delivery_plan):
-                            itemlist = list(item)
-                            if itemlist[0] == manufacturer_agent_id:
-                                order.manufacturer_delivery_plan.remove(order.manufacturer_delivery_plan[index])
-                                order.num_delivered_to_retailer += 1
+        due_deliveries = self.calendar.pop_due(EventCalendar.delivery_to_retailer, self.current_step)
+        due_deliveries.sort(key = lambda event: event[0].order_number)
+        for (order, plan) in due_deliveries:
+            (manufacturer_agent_id, delivery_step, amount, price) = plan
+            retailer = self.find_agent_by_id(order.retailer_agent_id)
+            manufacturer = self.find_agent_by_id(manufacturer_agent_id)
+
+            step_income = (price * amount)
+            # compounded_for_tc = step_income * (1 + (manufacturer.tc_rate / self._year))**manufacturer.payment_term
+            self.ledger.issue(manufacturer, step_income, self.current_step + manufacturer.payment_term, buyer = retailer)
+            # manufacturer.working_capital += step_income
+            self.release_inventory(manufacturer)
+
+            # price_to_pay = compounded_for_tc
+            # retailer.working_capital -= price_to_pay
+            self.stock_inventory(retailer, step_income, self.current_step + retailer.production_time)
+
+            order.amount_delivered_to_retailer += amount
+            order.manufacturer_delivery_plan.remove(plan)
+            order.num_delivered_to_retailer += 1
+            if not order.manufacturer_delivery_plan:
+                self.order_book.leave(order, OrderBook.delivering_to_retailer)
 
     def plan_delivery_by_retailer(self):
         """
         Short term bank financing of retailer is planned in this method.
         """
-        plan_delivery_list = [order for order in self.list_orders if order.completed_delivering_to_manufacturers
-                              and not order.planned_delivery_by_retailer
-                              and order.num_delivered_to_retailer == order.num_manufacturers]
+        plan_delivery_list = [order for order in self.order_book.stage(OrderBook.planning_delivery_by_retailer) 
+                              if order.num_delivered_to_retailer == order.num_manufacturers]
 
         for order in plan_delivery_list:
             retailer = self.find_agent_by_id(order.retailer_agent_id)
             order.completion_step = self.current_step + retailer.production_time
             amount = order.amount_delivered_to_retailer
             order.planned_delivery_by_retailer = True
+            self.order_book.move(order, OrderBook.planning_delivery_by_retailer, OrderBook.delivering_by_retailer)
+            self.calendar.schedule(EventCalendar.delivery_by_retailer, order.completion_step, order)
 
             if amount > retailer.q * retailer.working_capital and self._wcap_financing:
                 excess_order = amount - (retailer.q * retailer.working_capital)
@@ -669,19 +940,17 @@ class Evolve(Recorder):
         """
         Delivery behavior of retailers.
         """
-        delivery_by_retailer = [order for order in self.list_orders if order.completed_delivering_to_manufacturers
-                                and not order.order_completed
-                                and order.completion_step == self.current_step]
+        delivery_by_retailer = self.calendar.pop_due(EventCalendar.delivery_by_retailer, self.current_step)
+        delivery_by_retailer.sort(key = lambda order: order.order_number)
         for order in delivery_by_retailer:
             retailer = self.find_agent_by_id(order.retailer_agent_id)
             step_income = (order.retailer_selling_price * order.amount_delivered_to_retailer)
             # compounded_for_tc = step_income * (1 + (retailer.tc_rate / self._year))**retailer.payment_term
-            retailer.receivables.append((step_income, self.current_step + retailer.payment_term, 'outside'))
+            self.ledger.issue(retailer, step_income, self.current_step + retailer.payment_term)
             # retailer.working_capital += step_income
-            for tup in retailer.inventory_track:
-                if tup[1] <= self.current_step:
-                    retailer.inventory_track.remove(tup)
+            self.release_inventory(retailer)
             order.order_completed = True
+            self.order_book.archive(order)
 
     def short_term_financing(self, agent_id, amount) -> None:
         """
@@ -689,24 +958,29 @@ class Evolve(Recorder):
         """
         agent = self.find_agent_by_id(agent_id)
         agent.working_capital += amount
-        compounded_value = (amount) * ((1 + (agent.financing_rate / self._year)) ** (agent.financing_period))
+        compounded_value = (amount) * self.discount.growth(agent.financing_rate, agent.financing_period)
         agent.liability += compounded_value
         agent.time_of_next_allowed_financing = self.current_step + agent.days_between_financing
-        agent.financing_history.append((compounded_value, self.current_step, self.current_step + agent.financing_period))
+        agent.financing_history.append(Loan(compounded_value, self.current_step, self.current_step + agent.financing_period))
+        agent.open_loans.open(compounded_value, self.current_step + agent.financing_period, self.current_step, agent.financing_rate, self.discount)
+        if self.profiler is not None:
+            self.profiler.count('loans_opened')
+        self.history.record('financing', self.current_step, agent.agent_id, compounded_value)
+        self.calendar.schedule(EventCalendar.repayment, self.current_step + agent.financing_period, (agent, compounded_value))
 
     def repay_debt(self) -> None:
         """
         This method is used to enable agents to repay the loans.
         """
-        for agent in self.list_agents:
-            if agent.financing_history and not agent.bankruptcy:
-                for (amount, _, due_date) in agent.financing_history:
-                    if due_date == self.current_step:
-                        if agent.working_capital < amount:
-                            print(f'**default situation for agent {agent.agent_id} at step {self.current_step}')
-                            agent.in_default = True
-                        agent.working_capital -= amount
-                        agent.liability -= amount
+        for (agent, amount) in self.calendar.pop_due(EventCalendar.repayment, self.current_step):
+            if agent.bankruptcy:
+                continue
+            if agent.working_capital < amount:
+                if self.events.level <= WARNING:
+                    self.events.emit(self.current_step, WARNING, 'default', agent.agent_id, amount - agent.working_capital)
+                agent.in_default = True
+            agent.working_capital -= amount
+            agent.liability -= amount
 
     def check_for_bankruptcy(self):
         """
@@ -716,7 +990,8 @@ class Evolve(Recorder):
             if agent.equity <= 0 and not agent.bankruptcy:
                 bankrupted_agent_role = agent.role
                 agent.bankruptcy = True
-                print(f'bankruptcy noticed for agent {agent.agent_id}')
+                if self.events.level <= WARNING:
+                    self.events.emit(self.current_step, WARNING, 'bankruptcy', agent.agent_id, agent.equity)
 
                 if bankrupted_agent_role == 'r':
                     self.ret_list.remove(agent)
@@ -727,59 +1002,88 @@ class Evolve(Recorder):
                 if bankrupted_agent_role == 's':
                     self.sup_list.remove(agent)
 
+    def realize_selling_prices(self):
+        """
+        Draws the selling prices of the step for all active agents at once.
+        """
+        prices = self.draws.prices(self.current_step)
+        for (agent, price) in zip(self.list_agents, prices.tolist()):
+            if not agent.bankruptcy:
+                agent.selling_price = price
+
     def check_working_capital(self):
         """
         This method is responsible for tracking working capital of agents at the
         end of each step.
         """
-        step = self.current_step
-        for agent in self.list_agents:
-            if not agent.bankruptcy:
-                agent.list_working_capital.append((agent.working_capital, step))
+        if self._vectorized:
+            self.agent_arrays.record_working_capital(self.current_step, self.history)
+            return
+
+        agents = [agent for agent in self.list_agents if not agent.bankruptcy]
+        self.history.record('working_capital', self.current_step, [agent.agent_id for agent in agents], [agent.working_capital for agent in agents])
+
+    def step_phases(self) -> list:
+        """
+        The methods run by proceed() in the current step, in order.
+        """
+        phases = [self.check_receivables_and_payables,
+                  self.calculate_inventory_receivable_payable_values]
+        if self.current_step >= self._half_year:
+            phases.append(self.periodic_long_term_debt_revision)
+        phases += [self.update_total_assets_and_liabilities_and_equity,
+                   self.fixed_cost_and_cost_of_capital_subtraction,
+                   self.check_for_bankruptcy]
+        if self.current_step > self._credit_rating_step:
+            phases += [self.credit_calculations, self.calculate_agent_interest_rate]
+        if self._SC_financing:
+            phases.append(self.check_reverse_factoring_availability)
+        if self._wcap_financing:
+            phases += [self.repay_debt, self.check_credit_availability]
+        phases += [self.realize_selling_prices,
+                   self.determine_capacity,
+                   self.receive_order_by_retailers,
+                   self.create_order_object,
+                   self.order_to_manufacturers,
+                   self.order_to_suppliers,
+                   self.calculate_order_partners,
+                   self.deliver_to_manufacturers,
+                   self.plan_delivery_to_retailer,
+                   self.deliver_to_retailer,
+                   self.plan_delivery_by_retailer,
+                   self.retailer_delivery,
+                   self.check_working_capital]
+        return phases
 
     def proceed(self, steps: int) -> None:
         """
         Pushes the model forward.
         """
+        self.history.reserve(self.current_step + steps)
+        start = time.perf_counter()
+        checkpoint_seconds = self.checkpointer.seconds if self.checkpointer is not None else 0.0
         for _ in range(steps):
-            try:
-                self.current_step += 1
-                print(f'at step: {self.current_step}')
-
-                self.check_receivables_and_payables()
-                self.calculate_inventory_receivable_payable_values()
-
-                if self.current_step >= self._half_year:
-                    self.periodic_long_term_debt_revision()
-
-                self.update_total_assets_and_liabilities_and_equity()
-                self.fixed_cost_and_cost_of_capital_subtraction()
-                self.check_for_bankruptcy()
-
-                if self.current_step > self._credit_rating_step:
-                    self.credit_calculations()
-                    self.calculate_agent_interest_rate()
-
-                if self._SC_financing:
-                    self.check_reverse_factoring_availability()
-
-                if self._wcap_financing:
-                    self.repay_debt()
-                    self.check_credit_availability()
-
-                self.realize_selling_prices()
-                self.determine_capacity()
-                self.receive_order_by_retailers()
-                self.create_order_object()
-                self.order_to_manufacturers()
-                self.order_to_suppliers()
-                self.calculate_order_partners()
-                self.deliver_to_manufacturers()
-                self.plan_delivery_to_retailer()
-                self.deliver_to_retailer()
-                self.plan_delivery_by_retailer()
-                self.retailer_delivery()
-                self.check_working_capital()
-
-            except Exception as err:
-                print(err)
\ No newline at end of file
+            self.current_step += 1
+            if self.events.level <= DEBUG:
+                self.events.emit(self.current_step, DEBUG, 'step')
+            for phase in self.step_phases():
+                try:
+                    if self.profiler is None:
+                        phase()
+                    else:
+                        self.profiler.run(self.current_step, phase)
+                except Exception as err:
+                    if self._strict:
+                        raise SimulationError(phase.__name__, self.current_step, err) from err
+                    self.events.emit(self.current_step, ERROR, 'error', message = f'{phase.__name__}: {err!r}')
+                    break
+
+            if self.checkpointer is not None and self.checkpointer.due(self.current_step):
+                self.checkpointer.write(self, self.current_step)
+
+        if self.checkpointer is not None:
+            spent = self.checkpointer.seconds - checkpoint_seconds
+            elapsed = time.perf_counter() - start
+            self.events.emit(self.current_step, INFO, 'checkpoint', value = spent,
+                             message = f'{spent:.3f} s of {elapsed:.3f} s ({100 * spent / max(elapsed, 1e-9):.2f}%) spent on checkpoints')
+        self.events.flush()
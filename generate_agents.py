@@ -1,28 +1,94 @@
-import sys, os
+import os
+import gc
+import pickle
+import hashlib
+import tempfile
 from typing import List
+import numpy as np
 import pandas as pd
-from sclib.agent import Agent 
+from sclib.agent import Agent
+
+AGENT_COLUMNS = ('agent_id', 'role', 'working_capital', 'mu_selling_price', 'sigma_selling_price',
+                 'q', 'consumer_demand_mean', 'input_margin', 'interest_rate', 'fixed_cost',
+                 'days_between_financing', 'financing_period', 'ordering_period', 'delivery_period',
+                 'fixed_assets', 'payment_term', 'tc_rate', 'long_term_debt')  # In the order of the arguments of Agent().
+OPTIONAL_COLUMNS = ('long_term_debt',)                                         # The default of Agent() is used when missing.
+
+
+def build_agents(df: pd.DataFrame) -> list:
+    """
+    Instantiates one Agent() per row of df, a table with the AGENT_COLUMNS of
+    the excel sheet, e.g. a GenAgents(...).df with some columns changed.
+    """
+    missing = [name for name in AGENT_COLUMNS if name not in df.columns and name not in OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f'build_agents: missing columns {missing}')
+    columns = [df[name].tolist() for name in AGENT_COLUMNS if name in df.columns]   # Optional columns come last, so positions hold.
+    enabled = gc.isenabled()
+    gc.disable()                                                               # Collections triggered by the new objects would rescan all of them.
+    try:
+        return [Agent(*row) for row in zip(*columns)]
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_table(source) -> pd.DataFrame:
+    """
+    The agent table of source: a DataFrame, a NumPy structured array, or the
+    path of a .xlsx, .xls, .csv, .parquet or .npy (structured array) file.
+    """
+    if isinstance(source, pd.DataFrame):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        extension = os.path.splitext(source)[1].lower()
+        if extension in ('.xlsx', '.xls'):
+            return pd.read_excel(source)
+        if extension == '.csv':
+            return pd.read_csv(source)
+        if extension == '.parquet':
+            return pd.read_parquet(source)
+        if extension == '.npy':
+            source = np.load(source, allow_pickle = False)
+        else:
+            raise ValueError(f'read_table: unsupported file type "{extension}"')
+    if isinstance(source, np.ndarray) and source.dtype.names:
+        return pd.DataFrame({name: np.char.decode(source[name]) if source.dtype[name].kind == 'S' else source[name]
+                             for name in source.dtype.names})
+    raise ValueError(f'read_table: cannot read an agent table from {type(source).__name__}')
+
 
 class GenAgents:
     """
     This class is responsible for generating instances of agent.Agent() by
-    reading arguments from an excel sheet. It stores the generated agents in a
-    list called list_agents and returns that list.
+    reading arguments from an excel sheet (or a csv, parquet or npy file, a
+    DataFrame or a NumPy structured array). It stores the generated agents in
+    a list called list_agents and returns that list.
+
+    With a cache_dir, the table parsed from a file is kept there and reused
+    while the file keeps its modification time and size, or its content when
+    only those changed.
     """
     list_agents: List[Agent]
 
-    def __init__(self, excel_file: str):
+    def __init__(self, excel_file, cache_dir: str = None):
         """
         constructor
          Input:
-           excel_file: A file.xlsx that provides parameters of Agent() class 
-                       in the proper order.
+           excel_file: A file.xlsx (or .xls, .csv, .parquet, .npy) that provides
+                       parameters of Agent() class, or the table itself as a
+                       DataFrame or a NumPy structured array.
+           cache_dir: optional directory of the parsed tables.
         """
         self.excel_file = excel_file
-        self.__check_excel_file()
+        self.cache_dir = cache_dir
         self.list_agents = list()
 
-        self.__read_excel_file()
+        if isinstance(excel_file, (str, os.PathLike)):
+            self.__check_excel_file()
+            self.__read_excel_file()
+        else:
+            self.df = read_table(excel_file)
         self.__get_list_agents()
 
     def __check_excel_file(self) -> None:
@@ -30,39 +96,49 @@ class GenAgents:
         This method makes sure that a proper excel sheet is passed to the class.
         """
         if not os.path.exists(self.excel_file):
-            raise FileNotFoundError
-            sys.exit(1)
+            raise FileNotFoundError(f'__check_excel_file: {self.excel_file} does not exist')
 
     def __read_excel_file(self) -> None:
         """
-        This method creates a dataframe from the excel_file passed to the 
-        GenAgents class as an argument
+        This method creates a dataframe from the file passed to the GenAgents
+        class as an argument, through the cache when there is one.
         """
-        df = pd.read_excel(self.excel_file)
-        self.df = df
-        print(self.df)
+        if self.cache_dir is None:
+            self.df = read_table(self.excel_file)
+            return
+
+        path = os.path.abspath(self.excel_file)
+        stat = os.stat(path)
+        entry_path = os.path.join(self.cache_dir, hashlib.sha256(path.encode()).hexdigest() + '.pkl')
+        entry = None
+        try:
+            with open(entry_path, 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+        if entry is not None and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+            self.df = entry['df']
+            return
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        if entry is not None and entry['sha256'] == digest.hexdigest():        # Touched or copied, not changed.
+            self.df = entry['df']
+        else:
+            self.df = read_table(path)
+
+        os.makedirs(self.cache_dir, exist_ok = True)
+        entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest.hexdigest(), 'df': self.df}
+        (handle, temporary) = tempfile.mkstemp(dir = self.cache_dir, suffix = '.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            pickle.dump(entry, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, entry_path)
 
     def __get_list_agents(self) -> None:
         """
         This method is responsible for instanciating Agent() objects and adding
         those objects to self.list_agents.
         """
-        for i in range(len(self.df)):
-            x = Agent(self.df["agent_id"].at[i], 
-                      self.df["role"].at[i], 
-                      self.df["working_capital"].at[i], 
-                      self.df["mu_selling_price"].at[i],
-                      self.df["sigma_selling_price"].at[i],
-                      self.df["q"].at[i], 
-                      self.df["consumer_demand_mean"].at[i], 
-                      self.df["input_margin"].at[i],
-                      self.df["interest_rate"].at[i],
-                      self.df["fixed_cost"].at[i],
-                      self.df["days_between_financing"].at[i],
-                      self.df["financing_period"].at[i],
-                      self.df["ordering_period"].at[i],
-                      self.df["delivery_period"].at[i],
-                      self.df["fixed_assets"].at[i],
-                      self.df["payment_term"].at[i],
-                      self.df["tc_rate"].at[i])
-            self.list_agents.append(x)
\ No newline at end of file
+        self.list_agents = build_agents(self.df)
@@ -0,0 +1,230 @@
+import os
+import numpy as np
+
+class HistoryStore:
+    """
+    Preallocated record of per-agent metrics over the steps of a run. Every
+    metric is one float array of shape (steps, agents): row t - 1 holds the
+    values of step t and column i those of the agent with agent_id i. Arrays
+    are sized by Evolve.proceed() and grow by whole chunks of steps when a run
+    is extended. Cells that are never recorded (e.g. after bankruptcy) keep
+    the fill value of their metric.
+    """
+    chunk_steps = 256
+
+    def __init__(self, n_agents: int, fill_values: dict):
+        """
+        constructor
+         Input:
+           n_agents: number of agents, i.e. columns of every array.
+           fill_values: {metric name: value of the cells not recorded}.
+        """
+        self.n_agents = n_agents
+        self.fill_values = dict(fill_values)
+        self.arrays = {name: np.full((0, n_agents), fill) for (name, fill) in self.fill_values.items()}
+        self.counts = {name: np.zeros(n_agents, dtype = int) for name in self.fill_values}   # Number of records per agent.
+        self.capacity = 0
+
+    def reserve(self, last_step: int) -> None:
+        """
+        Makes room for the steps up to last_step, in whole chunks.
+        """
+        if last_step <= self.capacity:
+            return
+        capacity = -(-last_step // self.chunk_steps) * self.chunk_steps
+        for (name, array) in self.arrays.items():
+            grown = np.full((capacity, self.n_agents), self.fill_values[name])
+            grown[:self.capacity] = array
+            self.arrays[name] = grown
+        self.capacity = capacity
+
+    def add_agents(self, n_agents: int) -> None:
+        """
+        Adds columns for agents registered during a run.
+        """
+        if n_agents <= 0:
+            return
+        for (name, array) in self.arrays.items():
+            new_columns = np.full((self.capacity, n_agents), self.fill_values[name])
+            self.arrays[name] = np.hstack([array, new_columns])
+            self.counts[name] = np.append(self.counts[name], np.zeros(n_agents, dtype = int))
+        self.n_agents += n_agents
+
+    def record(self, name: str, step: int, agent_ids, values) -> None:
+        """
+        Stores the values of one metric for the given agents at step.
+        """
+        if step > self.capacity:
+            self.reserve(step)
+        self.arrays[name][step - 1, agent_ids] = values
+        self.counts[name][agent_ids] += 1
+
+    def recent(self, name: str, agent_id, step: int, n: int) -> np.ndarray:
+        """
+        The values of one agent over the n steps up to and including step;
+        with an array of agent ids, one column per agent.
+        """
+        return self.arrays[name][step - n:step, agent_id]
+
+    def matrix(self, name: str, first_step: int, last_step: int, n_agents: int) -> np.ndarray:
+        """
+        A view of shape (n_agents, last_step - first_step + 1) on the record of
+        a metric; column j holds step first_step + j.
+        """
+        self.reserve(last_step)
+        return self.arrays[name][first_step - 1:last_step, :n_agents].T
+
+    def head(self, last_step: int) -> 'HistoryStore':
+        """
+        A store sharing (not copying) the steps up to last_step and the counts
+        of this one, e.g. to pickle only the steps that have been run instead
+        of the whole preallocated capacity.
+        """
+        store = HistoryStore.__new__(HistoryStore)
+        store.n_agents = self.n_agents
+        store.fill_values = self.fill_values
+        store.arrays = {name: array[:last_step] for (name, array) in self.arrays.items()}
+        store.counts = self.counts
+        store.capacity = min(last_step, self.capacity)
+        return store
+
+    def segment(self, first_step: int, last_step: int) -> dict:
+        """
+        {metric name: view of the rows of steps first_step .. last_step}.
+        """
+        return {name: array[first_step - 1:last_step] for (name, array) in self.arrays.items()}
+
+    def fill(self, first_step: int, rows: dict) -> None:
+        """
+        Writes back rows returned by segment(), from first_step on. Agents
+        registered after the rows were taken keep their fill value.
+        """
+        for (name, values) in rows.items():
+            last_step = first_step + len(values) - 1
+            self.reserve(last_step)
+            self.arrays[name][first_step - 1:last_step, :values.shape[1]] = values
+
+
+class StreamingHistoryStore:
+    """
+    A HistoryStore that keeps only the last flush_steps steps in memory. Each
+    time the in-memory block is full it is appended to one raw float64 file
+    per metric in directory (laid out steps x agents, like HistoryStore), so
+    the memory held does not depend on the length of a run. matrix() returns
+    views on np.memmap objects of those files, which load pages lazily.
+    The number of agents is fixed when the store is created.
+    """
+    def __init__(self, directory: str, n_agents: int, fill_values: dict, flush_steps: int = 256):
+        """
+        constructor
+         Input:
+           directory: where the files <metric>.f8 are written; created if needed
+                      and reused files are truncated.
+           n_agents: number of agents, i.e. columns of every array.
+           fill_values: {metric name: value of the cells not recorded}.
+           flush_steps: number of steps kept in memory between two flushes.
+        """
+        if flush_steps < 1:
+            raise ValueError(f'StreamingHistoryStore: flush_steps = {flush_steps} must be at least 1')
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.n_agents = n_agents
+        self.fill_values = dict(fill_values)
+        self.flush_steps = flush_steps
+        self.counts = {name: np.zeros(n_agents, dtype = int) for name in self.fill_values}
+        self.flushed_steps = 0                                                 # Steps that are on disk for good.
+        self._blocks = {name: np.full((flush_steps, n_agents), fill) for (name, fill) in self.fill_values.items()}
+        self._maps = dict()                                                    # metric -> np.memmap of its file, reset after writes.
+        for name in self.fill_values:
+            open(self.path(name), 'wb').close()
+
+    def path(self, name: str) -> str:
+        """
+        The file holding the flushed steps of a metric.
+        """
+        return os.path.join(self.directory, f'{name}.f8')
+
+    def reserve(self, last_step: int) -> None:
+        """
+        Nothing to preallocate; kept for the interface of HistoryStore.
+        """
+
+    def add_agents(self, n_agents: int) -> None:
+        if n_agents > 0:
+            raise ValueError('add_agents: the streaming history store has a fixed number of agents')
+
+    def record(self, name: str, step: int, agent_ids, values) -> None:
+        """
+        Stores the values of one metric for the given agents at step.
+        """
+        if step <= self.flushed_steps:
+            raise ValueError(f'record: step {step} has already been flushed to disk')
+        while step > self.flushed_steps + self.flush_steps:
+            self.flush()
+        self._blocks[name][step - self.flushed_steps - 1, agent_ids] = values
+        self.counts[name][agent_ids] += 1
+
+    def flush(self) -> None:
+        """
+        Writes the in-memory block of every metric to disk and starts the next
+        block.
+        """
+        for (name, block) in self._blocks.items():
+            self.__write(name, self.flushed_steps + 1, block)
+            block.fill(self.fill_values[name])
+        self.flushed_steps += self.flush_steps
+
+    def __write(self, name: str, first_step: int, rows: np.ndarray) -> None:
+        with open(self.path(name), 'r+b') as file:
+            file.seek((first_step - 1) * self.n_agents * rows.itemsize)
+            file.write(np.ascontiguousarray(rows).tobytes())
+        self._maps.pop(name, None)
+
+    def __map(self, name: str) -> np.ndarray:
+        if name not in self._maps:
+            n_steps = os.path.getsize(self.path(name)) // (self.n_agents * 8) if self.n_agents else 0
+            if n_steps:
+                self._maps[name] = np.memmap(self.path(name), dtype = float, mode = 'r', shape = (n_steps, self.n_agents))
+            else:
+                self._maps[name] = np.empty((0, self.n_agents))
+        return self._maps[name]
+
+    def recent(self, name: str, agent_id, step: int, n: int) -> np.ndarray:
+        """
+        The values of one agent over the n steps up to and including step;
+        with an array of agent ids, one column per agent.
+        """
+        first_step = step - n + 1
+        in_block = self._blocks[name][max(first_step - self.flushed_steps - 1, 0):step - self.flushed_steps, agent_id]
+        if first_step > self.flushed_steps:
+            return in_block
+        on_disk = self.__map(name)[first_step - 1:min(step, self.flushed_steps), agent_id]
+        return np.concatenate([on_disk, in_block])
+
+    def matrix(self, name: str, first_step: int, last_step: int, n_agents: int) -> np.ndarray:
+        """
+        A disk-backed view of shape (n_agents, last_step - first_step + 1) on
+        the record of a metric; column j holds step first_step + j. The steps
+        still in memory are written out first (they are written again by the
+        next flush), so the view is complete up to last_step.
+        """
+        block = self._blocks[name]
+        n_pending = min(max(last_step - self.flushed_steps, 0), self.flush_steps)
+        if n_pending:
+            self.__write(name, self.flushed_steps + 1, block[:n_pending])
+        n_missing = last_step - self.flushed_steps - self.flush_steps
+        if n_missing > 0:                                                      # Steps never reached keep the fill value.
+            self.__write(name, self.flushed_steps + 1, block)
+            self.__write(name, self.flushed_steps + self.flush_steps + 1, np.full((n_missing, self.n_agents), self.fill_values[name]))
+        return self.__map(name)[first_step - 1:last_step, :n_agents].T
+
+    def to_memory(self, last_step: int) -> HistoryStore:
+        """
+        Loads the steps up to last_step into an in-memory HistoryStore.
+        """
+        store = HistoryStore(self.n_agents, self.fill_values)
+        store.reserve(last_step)
+        for name in self.fill_values:
+            store.arrays[name][:last_step] = self.matrix(name, 1, last_step, self.n_agents).T
+            store.counts[name] = self.counts[name].copy()
+        return store
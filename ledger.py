@@ -0,0 +1,110 @@
+from typing import NamedTuple
+from sclib.event_calendar import EventCalendar
+
+class Invoice(NamedTuple):
+    amount: float
+    due_date: int
+    counterparty: object                                                       # buyer_id of a receivable, seller_id of a payable.
+
+
+class BankPayment(NamedTuple):
+    amount: float
+    due_date: int
+
+
+class TradeCreditLedger:
+    """
+    Book of the trade-credit invoices of a model. Each delivery on credit
+    issues an invoice with a unique id. The seller's receivable and the
+    buyer's payable are filed under that id, in the dictionaries
+    agent.receivables {id: Invoice(amount, due_date, buyer_id)} and
+    agent.payables {id: Invoice(amount, due_date, seller_id)}. A reverse factoring
+    sale then finds the matching payable directly. The open receivables of
+    each seller are also indexed by buyer, and every entry is filed in the
+    settlement channel of the calendar under its due date. The ledger keeps
+    agent.receivables_value and agent.payables_value up to date as entries
+    are issued, reduced and settled.
+    """
+    outside = 'outside'                                                        # buyer_id of the consumers retailers sell to.
+
+    def __init__(self, calendar: EventCalendar):
+        """
+        constructor
+         Input:
+           calendar: the EventCalendar of the model, where settlements are filed
+                     as (agent, account, invoice_id) events.
+        """
+        self.calendar = calendar
+        self.next_invoice_id = 0
+        self._by_buyer = dict()                                                # seller_id -> buyer_id -> {invoice_id: None}, in issue order.
+        self.profiler = None                                                   # A PhaseProfiler counting the items touched, when profiling.
+
+    def issue(self, seller, amount: float, due_date: int, buyer = None) -> int:
+        """
+        Books a receivable of seller and, unless buyer is None (a sale to the
+        outside consumers), the matching payable of buyer. Returns the id of
+        the invoice.
+        """
+        invoice_id = self.next_invoice_id
+        self.next_invoice_id += 1
+        if self.profiler is not None:
+            self.profiler.count('ledger_items', 1 if buyer is None else 2)
+        buyer_id = self.outside if buyer is None else buyer.agent_id
+        seller.receivables[invoice_id] = Invoice(amount, due_date, buyer_id)
+        seller.receivables_value += amount
+        self._by_buyer.setdefault(seller.agent_id, dict()).setdefault(buyer_id, dict())[invoice_id] = None
+        self.calendar.schedule(EventCalendar.settlement, due_date, (seller, 'receivables', invoice_id))
+        if buyer is not None:
+            buyer.payables[invoice_id] = Invoice(amount, due_date, seller.agent_id)
+            buyer.payables_value += amount
+            self.calendar.schedule(EventCalendar.settlement, due_date, (buyer, 'payables', invoice_id))
+        return invoice_id
+
+    def buyers(self, seller) -> dict:
+        """
+        The open receivables of seller by buyer: {buyer_id: {invoice_id: None}}.
+        """
+        return self._by_buyer.get(seller.agent_id, dict())
+
+    def factor(self, seller, buyer, invoice_id: int, ratio: float) -> None:
+        """
+        Reverse factoring of a share ratio of a receivable of seller. The
+        receivable and the buyer's payable are reduced to the unsold share and
+        the buyer owes the difference to the bank, as a scheduled_money_payment
+        with the due date of the invoice.
+        """
+        (amount, due_date, buyer_id) = seller.receivables[invoice_id]
+        new_amount = amount * (1 - ratio)
+        if self.profiler is not None:
+            self.profiler.count('ledger_items', 2)
+        seller.receivables[invoice_id] = Invoice(new_amount, due_date, buyer_id)
+        seller.receivables_value -= amount - new_amount
+        payable = buyer.payables.get(invoice_id)
+        if payable is None:
+            return
+        pay_to_bank = payable.amount - new_amount
+        buyer.payables[invoice_id] = Invoice(new_amount, due_date, seller.agent_id)
+        buyer.payables_value -= payable.amount - new_amount
+        if invoice_id in buyer.scheduled_money_payment:                        # Sold again on a later step; the settlement is filed already.
+            pay_to_bank += buyer.scheduled_money_payment[invoice_id].amount
+        else:
+            self.calendar.schedule(EventCalendar.settlement, due_date, (buyer, 'scheduled_money_payment', invoice_id))
+        buyer.scheduled_money_payment[invoice_id] = BankPayment(pay_to_bank, due_date)
+
+    def settle(self, agent, account: str, invoice_id: int) -> None:
+        """
+        Removes a settled entry from one of the accounts of agent
+        ('receivables', 'payables' or 'scheduled_money_payment').
+        """
+        entries = getattr(agent, account)
+        entry = entries.pop(invoice_id)
+        if self.profiler is not None:
+            self.profiler.count('ledger_items')
+        if account == 'receivables':
+            invoices = self._by_buyer[agent.agent_id][entry.counterparty]
+            del invoices[invoice_id]
+            if not invoices:
+                del self._by_buyer[agent.agent_id][entry.counterparty]
+            agent.receivables_value = agent.receivables_value - entry.amount if entries else 0.0    # An empty account is exactly zero.
+        elif account == 'payables':
+            agent.payables_value = agent.payables_value - entry.amount if entries else 0.0
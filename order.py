@@ -7,9 +7,16 @@ class Order_Package:
     and delivery actions related to the initial irder.
     """
 
-    order_number = 1
+    next_order_number = 1                                                      # Counter used when no order_number is given.
+    __slots__ = ('order_number', 'initial_order_amount', 'amount_delivered_to_retailer', 'retailer_agent_id',
+                 'order_initialization_step', 'retailer_selling_price', 'completion_step', 'num_manufacturers',
+                 'num_delivered_to_retailer', 'manufacturers', 'suppliers', 'manufacturer_supplier_pairs',
+                 'manufacturer_delivery_plan', 'planned_manufacturers', 'manufacturers_num_partners',
+                 'created_pairs', 'completed_ordering_to_manufacturers', 'completed_ordering_to_suppliers',
+                 'completed_delivering_to_manufacturers', 'planned_delivery_by_retailer', 'order_completed',
+                 'order_feasibility')
 
-    def __init__(self, initial_order_amount, retailer_agent_id, order_initialization_step, retailer_selling_price):
+    def __init__(self, initial_order_amount, retailer_agent_id, order_initialization_step, retailer_selling_price, order_number = None):
         """
         constructor
          Input:
@@ -17,8 +24,13 @@ class Order_Package:
            retailer_agent_id: agent_id related to the retailer.
            order_initialization_step: Marks the step that the order object is created.
            retailer_selling_price: selling price of retailer at the moment of instanciating an order object.
+           order_number: number given by the model; by default the next value of
+                         the counter Order_Package.next_order_number shared by the process.
         """
-        self.order_number = Order_Package.order_number
+        if order_number is None:
+            order_number = Order_Package.next_order_number
+            Order_Package.next_order_number += 1
+        self.order_number = order_number
         self.initial_order_amount = initial_order_amount
         self.amount_delivered_to_retailer = 0
         self.retailer_agent_id = retailer_agent_id
@@ -44,4 +56,74 @@ class Order_Package:
 
         self.order_feasibility = True
 
-        Order_Package.order_number += 1
\ No newline at end of file
+
+class OrderBook:
+    """
+    Keeps the active Order_Package objects of a model in per-stage queues, so
+    that each phase of Evolve only visits the orders of its own stage instead
+    of filtering every order ever created. An order can wait in more than one
+    queue at a time, e.g. a manufacturer may already be planned for delivery to
+    the retailer while other manufacturers of the same order still wait for
+    their suppliers. Completed and infeasible orders are archived.
+    """
+    ordering_to_manufacturers = 'ordering_to_manufacturers'
+    ordering_to_suppliers = 'ordering_to_suppliers'
+    pairing = 'pairing'
+    delivering_to_manufacturers = 'delivering_to_manufacturers'
+    planning_delivery_to_retailer = 'planning_delivery_to_retailer'
+    delivering_to_retailer = 'delivering_to_retailer'
+    planning_delivery_by_retailer = 'planning_delivery_by_retailer'
+    delivering_by_retailer = 'delivering_by_retailer'
+
+    stages = (ordering_to_manufacturers, ordering_to_suppliers, pairing,
+              delivering_to_manufacturers, planning_delivery_to_retailer,
+              delivering_to_retailer, planning_delivery_by_retailer,
+              delivering_by_retailer)
+
+    def __init__(self):
+        """
+        constructor
+        """
+        self.queues = {stage: dict() for stage in self.stages}                #Each queue maps order_number to Order_Package
+        self.archived_orders = list()
+        self.profiler = None                                                   # A PhaseProfiler counting the orders scanned, when profiling.
+
+    def __len__(self) -> int:
+        """
+        Number of orders that are not archived yet.
+        """
+        return len(set().union(*self.queues.values()))
+
+    def add(self, order: Order_Package) -> None:
+        """
+        Puts a newly created order in the first stage.
+        """
+        self.queues[self.ordering_to_manufacturers][order.order_number] = order
+
+    def stage(self, stage: str) -> list:
+        """
+        Returns the orders waiting in a stage in the order of their creation,
+        which is the order in which Evolve.list_orders holds them.
+        """
+        queue = self.queues[stage]
+        if self.profiler is not None:
+            self.profiler.count('orders_scanned', len(queue))
+        return [queue[number] for number in sorted(queue)]
+
+    def enter(self, order: Order_Package, stage: str) -> None:
+        self.queues[stage][order.order_number] = order
+
+    def leave(self, order: Order_Package, stage: str) -> None:
+        self.queues[stage].pop(order.order_number, None)
+
+    def move(self, order: Order_Package, from_stage: str, to_stage: str) -> None:
+        self.leave(order, from_stage)
+        self.enter(order, to_stage)
+
+    def archive(self, order: Order_Package) -> None:
+        """
+        Removes a completed or infeasible order from every stage.
+        """
+        for queue in self.queues.values():
+            queue.pop(order.order_number, None)
+        self.archived_orders.append(order)
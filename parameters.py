@@ -1,70 +1,36 @@
-class Parameters:
+from enum import Enum
+
+class Role(str, Enum):
     """
-    The Parameters class contains constant constants of the model.
-    All attributes have a getter, but no setter. The default values
-    are set internally.
+    The layer of an agent. Being a str, a Role compares and hashes equal to
+    its letter, so 'r', 'm' and 's' can still be used wherever a role is
+    expected.
     """
-    _success: int                   # error code
-    _abort: int                     # error code
-    _retailer: str                  # Pre-defined agent role
-    _manufacturer: str              # Pre-defined agent role
-    _supplier: str                  # Pre-defined agent role
-    _abs_tol: float                 # The parameter used for abs_tolerance in math.isclose() method.
-    _RF_ratio : float               # The ratio of a receivable that can be sold.
-    _risk_free_rate: float          # The risk free investment rate
-    _interest_rate_margin: float    # The amount added to default risk to calculate short-term financing interest rate.
-    _ltd_volatility: float          # The allowed volatility
-
-    def __init__(self):
-        """ Constructor """
-
-        self._success = 1
-        self._abort = 0
-        self._retailer = 'r'
-        self._manufacturer = 'm'
-        self._supplier = 's'
-        self._abs_tol = 1e-4
-        self._RF_ratio = 0.7
-        self._risk_free_rate = 0.03
-        self._interest_rate_margin = 0.01
-        self._ltd_volatility = 0.2
-
-    @property
-    def success(self) -> int:
-        return self._success
-
-    @property
-    def abort(self) -> int:
-        return self._abort
-
-    @property
-    def retailer(self) -> str:
-        return self._retailer
+    retailer = 'r'
+    manufacturer = 'm'
+    supplier = 's'
 
-    @property
-    def manufacturer(self) -> str:
-        return self._manufacturer
+    def __str__(self) -> str:
+        return self.value
 
-    @property
-    def supplier(self) -> str:
-        return self._supplier
 
-    @property
-    def abs_tol(self) -> float:
-        return self._abs_tol
-
-    @property
-    def RF_ratio(self) -> float:
-        return self._RF_ratio
-
-    @property
-    def risk_free_rate(self) -> float:
-        return self._risk_free_rate
-
-    @property
-    def interest_rate_margin(self) -> float:
-        return self._interest_rate_margin
-
-    @property
-    def ltd_volatility(self) -> float:
-        return self._ltd_volatility
\ No newline at end of file
+class Parameters:
+    """
+    The Parameters class contains the constants of the model as class
+    attributes, shared by all agents instead of being copied onto each of
+    them. RF_ratio, risk_free_rate, interest_rate_margin and ltd_volatility
+    are the defaults of attributes of every Agent(), which a parameter sweep
+    may override on the agents of one run.
+    """
+    __slots__ = ()
+
+    success = 1                     # error code
+    abort = 0                       # error code
+    retailer = Role.retailer        # Pre-defined agent role
+    manufacturer = Role.manufacturer    # Pre-defined agent role
+    supplier = Role.supplier        # Pre-defined agent role
+    abs_tol = 1e-4                  # The parameter used for abs_tolerance in math.isclose() method.
+    RF_ratio = 0.7                  # The ratio of a receivable that can be sold.
+    risk_free_rate = 0.03           # The risk free investment rate
+    interest_rate_margin = 0.01     # The amount added to default risk to calculate short-term financing interest rate.
+    ltd_volatility = 0.2            # The allowed volatility
@@ -0,0 +1,38 @@
+from bisect import bisect_left
+import numpy as np
+
+class PriceIndex:
+    """
+    The sellers of one layer that have capacity left in the current step,
+    sorted by selling price (ties keep the order of list_agents). Prices and
+    capacities are fixed for the step before ordering starts and the greedy
+    allocation of Evolve always fills the cheapest sellers first, so the
+    sellers whose prod_cap has been used up form a prefix of the index. A
+    pointer skips that prefix and a bisect on price finds where the sellers
+    an order may use end, so an order only touches the sellers it fills
+    instead of filtering and sorting the whole layer.
+    """
+    def __init__(self, agents: list, prices):
+        """
+        constructor
+         Input:
+           agents: the Agent() objects of the layer with prod_cap > 0 that are
+                   not bankrupt, in the order of list_agents.
+           prices: their selling prices.
+        """
+        order = np.argsort(np.asarray(prices, dtype = float), kind = 'stable')
+        self.agents = [agents[i] for i in order.tolist()]
+        self.prices = np.asarray(prices, dtype = float)[order].tolist()
+        self.start = 0                                                         # Sellers before start have no capacity left.
+
+    def __len__(self) -> int:
+        return len(self.agents) - self.start
+
+    def below(self, price_limit: float) -> range:
+        """
+        Positions in self.agents of the sellers with capacity left whose
+        selling price is below price_limit, cheapest first.
+        """
+        while self.start < len(self.agents) and self.agents[self.start].prod_cap <= 0:
+            self.start += 1
+        return range(self.start, max(self.start, bisect_left(self.prices, price_limit)))
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import time
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd                                                        # pandas is imported when a DataFrame is built.
+
+class PhaseProfiler:
+    """
+    Wall time and work counters of the phases of Evolve.proceed(). Every
+    phase run through run() adds one record (step, phase, seconds, counters),
+    where counters holds what count() was told while the phase ran, e.g. the
+    orders scanned by OrderBook.stage(), the ledger items touched or the
+    find_agent_by_id calls. The records are aggregated per step, per phase
+    or as folded stacks for flame graph tools.
+    """
+    def __init__(self):
+        """
+        constructor
+        """
+        self.records = list()                                                  # (step, phase, seconds, {counter: n})
+        self._counters = dict()
+
+    def count(self, counter: str, n: int = 1) -> None:
+        """
+        Adds n to counter in the phase that is running.
+        """
+        self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def run(self, step: int, phase) -> None:
+        """
+        Calls phase() and records its wall time and counters under step.
+        """
+        self._counters = dict()
+        start = time.perf_counter()
+        try:
+            phase()
+        finally:
+            self.records.append((step, phase.__name__, time.perf_counter() - start, self._counters))
+            self._counters = dict()
+
+    def frame(self) -> pd.DataFrame:
+        """
+        One row per phase run: step, phase, seconds and one column per counter.
+        """
+        import pandas as pd
+        rows = [dict(counters, step = step, phase = phase, seconds = seconds) for (step, phase, seconds, counters) in self.records]
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return pd.DataFrame(columns = ['step', 'phase', 'seconds'])
+        counters = [name for name in df.columns if name not in ('step', 'phase', 'seconds')]
+        df[counters] = df[counters].fillna(0).astype(int)
+        return df[['step', 'phase', 'seconds'] + counters]
+
+    def by_step(self) -> pd.DataFrame:
+        """
+        Seconds and counters summed over the phases of each step.
+        """
+        return self.frame().drop(columns = 'phase').groupby('step').sum()
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Per phase over the run: calls, total and mean seconds, share of the
+        total time and summed counters, slowest phase first.
+        """
+        df = self.frame()
+        summary = df.groupby('phase', sort = False).agg(calls = ('seconds', 'size'), seconds = ('seconds', 'sum'))
+        summary['mean_seconds'] = summary['seconds'] / summary['calls']
+        summary['share'] = summary['seconds'] / summary['seconds'].sum()
+        counters = [name for name in df.columns if name not in ('step', 'phase', 'seconds')]
+        summary = summary.join(df.groupby('phase', sort = False)[counters].sum())
+        return summary.sort_values('seconds', ascending = False)
+
+    def folded(self) -> str:
+        """
+        The time per phase as folded stacks ("proceed;phase microseconds" per
+        line), the input format of flamegraph.pl, speedscope and similar tools.
+        """
+        seconds = self.summary()['seconds']
+        return '\n'.join(f'proceed;{phase} {round(value * 1e6)}' for (phase, value) in seconds.items())
+
+
+class CountingLookup:
+    """
+    Stands in for the find_agent_by_id method of a model while it is profiled,
+    counting the calls.
+    """
+    def __init__(self, model, profiler: PhaseProfiler):
+        """
+        constructor
+         Input:
+           model: the Evolve object.
+           profiler: the PhaseProfiler the calls are counted in.
+        """
+        self.model = model
+        self.profiler = profiler
+
+    def __call__(self, unique_id):
+        self.profiler.count('find_agent_by_id')
+        return type(self.model).find_agent_by_id(self.model, unique_id)
@@ -1,11 +1,13 @@
+from __future__ import annotations
 import math
 import copy
-from typing import List
+from typing import List, TYPE_CHECKING
 from math import log
 import numpy as np
-import pandas as pd
-from pandas import DataFrame
 from sclib.agent import Agent
+from sclib.history import HistoryStore
+if TYPE_CHECKING:
+    from pandas import DataFrame                                               # pandas is imported when a DataFrame is built.
 
 list_agents: List[Agent]
 current_step: int
@@ -26,14 +28,22 @@ class Recorder:
         self._n_agents = len(list_agents)
         self.__break_list()
         self.__check_duplicate_id()
+        self.__index_agents()
         self.__layers_fulfilled()
-        self._log_working_capital = self.__dummy_log_working_capital
-        self._log_financing = self.__dummy_log_financing()
-        self._log_dp = self.__dummy_log_default()
-        self._log_SCF = self.__dummy_log_SCF()
-        self._log_total_assets = self.__dummy_log_total_assets()
-        self._log_total_liabilities = self.__dummy_log_total_liabilities()
-        self._log_equity = self.__dummy_log_equity()
+        self.history = HistoryStore(self._n_agents, {'working_capital': 0.0,
+                                                     'financing': 0.0,
+                                                     'default_probability': 1.0,
+                                                     'SCF': 0.0,
+                                                     'total_assets': 0.0,
+                                                     'total_liabilities': 0.0,
+                                                     'equity': 0.0})
+        self._log_working_capital = None                                       # DataFrames built by the log_* methods; a placeholder until then.
+        self._log_financing = None
+        self._log_dp = None
+        self._log_SCF = None
+        self._log_total_assets = None
+        self._log_total_liabilities = None
+        self._log_equity = None
 
         self._initial_list_agents = copy.deepcopy(list_agents)
         self.__choose_default_agent_to_replace()
@@ -48,30 +58,44 @@ class Recorder:
 
     @property
     def log_working_capital(self) -> DataFrame:
+        if self._log_working_capital is None:
+            self._log_working_capital = self.__dummy_log_working_capital()
         return self._log_working_capital
     
     @property
     def log_financing(self) -> DataFrame:
+        if self._log_financing is None:
+            self._log_financing = self.__dummy_log_financing()
         return self._log_financing
 
     @property
     def log_dp(self) -> DataFrame:
+        if self._log_dp is None:
+            self._log_dp = self.__dummy_log_default()
         return self._log_dp
 
     @property
     def log_SCF(self) -> DataFrame:
+        if self._log_SCF is None:
+            self._log_SCF = self.__dummy_log_SCF()
         return self._log_SCF
 
     @property
     def log_total_assets(self) -> DataFrame:
+        if self._log_total_assets is None:
+            self._log_total_assets = self.__dummy_log_total_assets()
         return self._log_total_assets
 
     @property
     def log_total_liabilities(self) -> DataFrame:
+        if self._log_total_liabilities is None:
+            self._log_total_liabilities = self.__dummy_log_total_liabilities()
         return self._log_total_liabilities
 
     @property
     def log_equity(self) -> DataFrame:
+        if self._log_equity is None:
+            self._log_equity = self.__dummy_log_equity()
         return self._log_equity
 
 
@@ -91,6 +115,31 @@ class Recorder:
             else:
                 agents_set.add(elem)
 
+    def __index_agents(self) -> None:
+        """
+        Builds the agent_id -> Agent() index used by find_agent_by_id.
+        """
+        self._agents_by_id = {agent.agent_id: agent for agent in self.list_agents}
+
+    def register_agent(self, agent: Agent) -> None:
+        """
+        Adds a new agent to the model. The agent is appended to list_agents,
+        to the list of its layer and to the agent_id index.
+        """
+        if agent.agent_id in self._agents_by_id:
+            raise ValueError(f'register_agent: agent_id {agent.agent_id} is already in use')
+        self.history.add_agents(agent.agent_id + 1 - self.history.n_agents)
+        self.list_agents.append(agent)
+        self._agents_by_id[agent.agent_id] = agent
+        self._n_agents += 1
+
+        if agent.role == agent.retailer:
+            self.ret_list.append(agent)
+        elif agent.role == agent.manufacturer:
+            self.man_list.append(agent)
+        else:
+            self.sup_list.append(agent)
+
     def __layers_fulfilled(self) -> None:
         """
         This method makes sure that there is at least one agent in each layer        
@@ -111,6 +160,7 @@ class Recorder:
         *The method log_wcap should be called in the main script before
         visualizing self.log_working_capital.
         """
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
@@ -122,6 +172,7 @@ class Recorder:
         *The method log_financing should be called in the main script before
         visualizing self.log_financing.
         """
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
@@ -133,6 +184,7 @@ class Recorder:
         *The method log_default_probability should be called in the main script before
         visualizing self.log_default_probability.
         """
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
@@ -144,21 +196,25 @@ class Recorder:
         *The method log_supply_chain_financing should be called in the main script before
         visualizing self._log_SCF.
         """
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
 
     def __dummy_log_total_assets(self):
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
 
     def __dummy_log_total_liabilities(self):
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
 
     def __dummy_log_equity(self):
+        import pandas as pd
         a = np.zeros(1)
         df = pd.DataFrame(a)
         return df
@@ -184,6 +240,15 @@ class Recorder:
         self.default_manufacturer = copy.deepcopy(defman)
         self.default_supplier = copy.deepcopy(defsup)
 
+    def __history_frame(self, metric: str, first_step: int, last_step: int, n_agents: int, columns: list) -> DataFrame:
+        """
+        Wraps the record of a metric in self.history in a DataFrame without
+        copying it; rows are agents and columns steps.
+        """
+        import pandas as pd
+        matrix = self.history.matrix(metric, first_step, last_step, n_agents)
+        return pd.DataFrame(matrix, columns = columns, copy = False)
+
     def log_wcap(self, proceed_steps: int, final_list_agents: list) -> None:
         """
         This method creates a DataFrame with working_capital amounts.
@@ -192,14 +257,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
             """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.list_working_capital:
-                matrix[aid][step - 1] = amount
-        log_wcap = pd.DataFrame(matrix, columns = v)
-        self._log_working_capital = log_wcap
+        self._log_working_capital = self.__history_frame('working_capital', 1, proceed_steps, len(final_list_agents), v)
 
     def log_short_term_financing(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -209,14 +267,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step, _) in agent.financing_history:
-                matrix[aid][step - 1] = amount
-        log_financing = pd.DataFrame(matrix, columns = v)
-        self._log_financing = log_financing
+        self._log_financing = self.__history_frame('financing', 1, proceed_steps, len(final_list_agents), v)
 
     def log_default_probability(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -226,14 +277,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(self._credit_rating_step + 1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.ones([total_agents, proceed_steps - self._credit_rating_step])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.default_probability_history:
-                matrix[aid][step - (self._credit_rating_step + 1)] = amount
-        log_dp = pd.DataFrame(matrix, columns = v)
-        self._log_dp = log_dp
+        self._log_dp = self.__history_frame('default_probability', self._credit_rating_step + 1, proceed_steps, len(final_list_agents), v)
 
     def log_supply_chain_financing(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -243,14 +287,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.SCF_history:
-                matrix[aid][step - 1] = amount
-        log_scf = pd.DataFrame(matrix, columns = v)
-        self._log_SCF = log_scf
+        self._log_SCF = self.__history_frame('SCF', 1, proceed_steps, len(final_list_agents), v)
 
     def log_assets(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -260,14 +297,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.total_assets_history:
-                matrix[aid][step - 1] = amount
-        log_assets = pd.DataFrame(matrix, columns = v)
-        self._log_total_assets = log_assets
+        self._log_total_assets = self.__history_frame('total_assets', 1, proceed_steps, len(final_list_agents), v)
 
     def log_liabilities(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -277,14 +307,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.total_liabilities_history:
-                matrix[aid][step - 1] = amount
-        log_liab = pd.DataFrame(matrix, columns = v)
-        self._log_total_liabilities = log_liab
+        self._log_total_liabilities = self.__history_frame('total_liabilities', 1, proceed_steps, len(final_list_agents), v)
 
     def log_Equity(self, proceed_steps: int, final_list_agents: list) -> None:
         """
@@ -294,14 +317,7 @@ class Recorder:
             final_list_agents = The final agents_object.list_agent.
         """
         v = [f'step_{i}' for i in range(1, proceed_steps + 1)]
-        total_agents = len(final_list_agents)
-        matrix = np.zeros([total_agents, proceed_steps])
-        for agent in final_list_agents:
-            aid = agent.agent_id
-            for (amount, step) in agent.equity_history:
-                matrix[aid][step - 1] = amount
-        log_E = pd.DataFrame(matrix, columns = v)
-        self._log_equity = log_E
+        self._log_equity = self.__history_frame('equity', 1, proceed_steps, len(final_list_agents), v)
 
     def almost_equal_to_zero(self, value: float, abs_tol: float) -> bool:
         """
@@ -314,15 +330,23 @@ class Recorder:
     def find_agent_by_id(self, unique_id: str) -> object:
         """
         Finds an agent whose id is equivalent to the unique_id proovided.
+        Bankrupt agents stay in the index, so they can still be found.
         
         Returns:
             An Agent() object with the agent_id that is identical to the uniqu_id
             provided as the argument of the method.
         """
-        return [agent for agent in self.list_agents if unique_id == agent.agent_id][0]
+        try:
+            return self._agents_by_id[unique_id]
+        except KeyError:
+            raise ValueError(f'find_agent_by_id: no agent with agent_id {unique_id}') from None
 
-    def realize_selling_prices(self):
+    def realize_selling_prices(self, rng = np.random):
+        """
+        Draws the selling price of every active agent from rng (a
+        numpy.random.Generator, the global np.random by default).
+        """
         for agent in self.list_agents:
             if not agent.bankruptcy:
-                step_selling_price = np.random.lognormal(mean = log(agent.mu_selling_price), sigma = agent.sigma_selling_price)
+                step_selling_price = rng.lognormal(mean = log(agent.mu_selling_price), sigma = agent.sigma_selling_price)
                 agent.selling_price = step_selling_price
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Monte Carlo replications of one population of agents, and scenario branches
+of one model, over a process pool.
+"""
+import io
+import copy
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sclib.evolve import Evolve
+
+METRICS = ('working_capital', 'financing', 'default_probability', 'SCF',
+           'total_assets', 'total_liabilities', 'equity')
+
+_population = None                                                             # The list_agents every worker copies for a replication.
+_base_model = None                                                             # The model forked branches continue from.
+
+
+def _init_worker(list_agents: list) -> None:
+    global _population
+    _population = list_agents
+
+
+def _replicate(index: int, seed_sequence: np.random.SeedSequence, steps: int, options: tuple,
+               metrics: tuple, summarize, quiet: bool):
+    """
+    Runs one replication on a fresh copy of the population and returns
+    (index, result).
+    """
+    model = Evolve(copy.deepcopy(_population), seed = seed_sequence)
+    for option in options:
+        getattr(model, option)()
+
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        model.proceed(steps)
+
+    if summarize is not None:
+        return index, summarize(model)
+    n_agents = len(model.list_agents)
+    return index, {name: np.array(model.history.matrix(name, 1, steps, n_agents)) for name in metrics}
+
+
+def run_replications(list_agents: list,
+                     n_replications: int,
+                     steps: int,
+                     seed: int = None,
+                     options: tuple = (),
+                     metrics: tuple = METRICS,
+                     summarize = None,
+                     n_workers: int = None,
+                     quiet: bool = True) -> list:
+    """
+    Runs n_replications models of the same population for steps steps each and
+    returns their results ordered by replication index.
+
+    Replication i draws from its own streams: its model is seeded with the
+    i-th child of np.random.SeedSequence(seed). The results therefore only depend on seed and
+    i, never on the number of workers or on the order in which they finish.
+     Input:
+       list_agents: the initial population, e.g. GenAgents(file).list_agents;
+                    it is copied for every replication and left untouched.
+       n_replications: number of models to run.
+       steps: number of steps passed to Evolve.proceed().
+       seed: entropy of the root SeedSequence; None draws fresh entropy.
+       options: names of Evolve methods called before proceeding, e.g.
+                ('activate_wcap_financing', 'always_shuffle').
+       metrics: names of the HistoryStore metrics returned for each run.
+       summarize: optional picklable function summarize(model) whose return
+                  value replaces the metric matrices, to keep transfers small.
+       n_workers: number of processes; None uses os.cpu_count() and 1 runs
+                  the replications in this process.
+       quiet: drops the output printed by the models.
+     Returns:
+       A list holding, for every replication, either summarize(model) or a
+       dict {metric: array of shape (agents, steps)}.
+    """
+    if n_replications < 0:
+        raise ValueError(f'run_replications: n_replications = {n_replications} is negative')
+    for name in metrics:
+        if name not in METRICS:
+            raise ValueError(f'run_replications: unknown metric "{name}"')
+
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_replications)
+    tasks = [(index, seed_sequences[index], steps, tuple(options), tuple(metrics), summarize, quiet) for index in range(n_replications)]
+    results = [None] * n_replications
+
+    if n_workers == 1:
+        _init_worker(list_agents)
+        for task in tasks:
+            index, result = _replicate(*task)
+            results[index] = result
+        _init_worker(None)
+        return results
+
+    with ProcessPoolExecutor(max_workers = n_workers, initializer = _init_worker, initargs = (list_agents,)) as executor:
+        futures = [executor.submit(_replicate, *task) for task in tasks]
+        for future in futures:
+            index, result = future.result()
+            results[index] = result
+    return results
+
+
+def _branch(name, options: tuple, steps: int, metrics: tuple, summarize, quiet: bool, snapshot: bytes):
+    """
+    Runs one branch, on the inherited copy of _base_model or on a model
+    restored from snapshot, and returns (name, result).
+    """
+    model = _base_model if snapshot is None else Evolve.restore(snapshot)
+    for option in options:
+        getattr(model, option)()
+
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        model.proceed(steps)
+
+    if summarize is not None:
+        return name, summarize(model)
+    n_agents = len(model.list_agents)
+    return name, {metric: np.array(model.history.matrix(metric, 1, model.current_step, n_agents)) for metric in metrics}
+
+
+def run_branches(model: Evolve,
+                 branches: dict,
+                 steps: int,
+                 metrics: tuple = METRICS,
+                 summarize = None,
+                 n_workers: int = None,
+                 quiet: bool = True) -> dict:
+    """
+    Continues model under several scenarios and returns their results. Each
+    branch starts from the current state of model (including its random
+    streams, so branches share common random numbers), applies its options
+    and proceeds steps steps; model itself is left untouched.
+
+    Where the platform allows it, workers are forked from this process, so
+    they inherit the model copy-on-write instead of unpickling it, and every
+    worker runs a single branch (maxtasksperchild = 1) to start from a clean
+    copy. Elsewhere each branch restores model.snapshot().
+     Input:
+       model: an Evolve object, typically after a common burn-in.
+       branches: {name: options}, options being names of Evolve methods such
+                 as ('activate_wcap_financing', 'always_shuffle').
+       steps: number of steps each branch proceeds.
+       metrics: names of the HistoryStore metrics returned for each branch.
+       summarize: optional picklable function summarize(model) whose return
+                  value replaces the metric matrices.
+       n_workers: number of processes; None uses os.cpu_count() and 1 runs
+                  the branches in this process.
+       quiet: drops the output printed by the models.
+     Returns:
+       {name: summarize(model) or {metric: array of shape (agents, steps so far)}}.
+    """
+    global _base_model
+    for name in metrics:
+        if name not in METRICS:
+            raise ValueError(f'run_branches: unknown metric "{name}"')
+    if model._streaming:
+        raise ValueError('run_branches: branches cannot share the files of a streaming history')
+
+    tasks = [(name, tuple(options), steps, tuple(metrics), summarize, quiet) for (name, options) in branches.items()]
+    if n_workers == 1:
+        snapshot = model.snapshot()
+        return dict(_branch(*task, snapshot) for task in tasks)
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _base_model = model
+        try:
+            with multiprocessing.get_context('fork').Pool(processes = n_workers, maxtasksperchild = 1) as pool:
+                results = pool.starmap(_branch, [task + (None,) for task in tasks], chunksize = 1)
+        finally:
+            _base_model = None
+        return dict(results)
+
+    snapshot = model.snapshot()
+    with ProcessPoolExecutor(max_workers = n_workers) as executor:
+        futures = [executor.submit(_branch, *task, snapshot) for task in tasks]
+        return dict(future.result() for future in futures)
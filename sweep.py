@@ -0,0 +1,179 @@
+"""
+Parameter sweeps: designs over the model constants and the agent columns,
+run as (design point x replication) jobs over a process pool and collected
+in one tidy table.
+"""
+import io
+import copy
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sclib.evolve import Evolve
+from sclib.generate_agents import AGENT_COLUMNS, build_agents
+
+CONSTANTS = ('RF_ratio', 'interest_rate_margin', 'ltd_volatility', 'risk_free_rate')    # Parameters, set on every agent.
+INTEGER_COLUMNS = ('days_between_financing', 'financing_period', 'ordering_period',
+                   'delivery_period', 'payment_term')
+SUMMARY_METRICS = ('working_capital', 'financing', 'default_probability', 'SCF', 'equity')
+
+_base = None                                                                   # The agent table every worker builds populations from.
+
+
+def _check_names(names) -> None:
+    for name in names:
+        if name not in CONSTANTS and (name not in AGENT_COLUMNS or name in ('agent_id', 'role')):
+            raise ValueError(f'sweep: "{name}" is neither a model constant nor an agent column')
+
+
+def grid(levels: dict) -> pd.DataFrame:
+    """
+    Full factorial design: one point per combination of levels,
+    e.g. grid({'RF_ratio': [0.5, 0.7, 0.9], 'payment_term': [10, 30]}).
+    """
+    _check_names(levels)
+    return pd.DataFrame(list(itertools.product(*levels.values())), columns = list(levels))
+
+
+def _scaled(bounds: dict, sample: np.ndarray) -> pd.DataFrame:
+    lows = np.array([low for (low, _) in bounds.values()], dtype = float)
+    highs = np.array([high for (_, high) in bounds.values()], dtype = float)
+    return pd.DataFrame(lows + sample * (highs - lows), columns = list(bounds))
+
+
+def latin_hypercube(bounds: dict, n_points: int, seed = None) -> pd.DataFrame:
+    """
+    Latin hypercube design of n_points points within bounds
+    {name: (low, high)}.
+    """
+    from scipy.stats import qmc
+    _check_names(bounds)
+    sampler = qmc.LatinHypercube(d = len(bounds), seed = np.random.default_rng(seed))
+    return _scaled(bounds, sampler.random(n_points))
+
+
+def sobol(bounds: dict, n_points: int, seed = None) -> pd.DataFrame:
+    """
+    Scrambled Sobol design of n_points points (best a power of two) within
+    bounds {name: (low, high)}.
+    """
+    from scipy.stats import qmc
+    _check_names(bounds)
+    sampler = qmc.Sobol(d = len(bounds), seed = np.random.default_rng(seed))
+    return _scaled(bounds, sampler.random(n_points))
+
+
+def population(base: pd.DataFrame, point: dict) -> list:
+    """
+    The agents of the table base with the values of point: an agent column
+    is set to the value for every agent (rounded for the integer columns) and
+    a model constant overrides the default of Parameters on every agent. The
+    overrides live on the new Agent() objects only, so nothing leaks into
+    other runs.
+    """
+    _check_names(point)
+    df = base.copy()
+    for (name, value) in point.items():
+        if name in AGENT_COLUMNS:
+            df[name] = int(round(value)) if name in INTEGER_COLUMNS else value
+    list_agents = build_agents(df)
+    for (name, value) in point.items():
+        if name in CONSTANTS:
+            for agent in list_agents:
+                setattr(agent, name, float(value))                             # Shadows the default of Parameters for this agent.
+    return list_agents
+
+
+def final_summary(model: Evolve) -> dict:
+    """
+    Default summary of a run: the share of bankrupt agents and the mean over
+    agents of every SUMMARY_METRICS at the last step.
+    """
+    step = model.current_step
+    n_agents = len(model.list_agents)
+    summary = {'bankrupt_share': float(np.mean([agent.bankruptcy for agent in model.list_agents]))}
+    for name in SUMMARY_METRICS:
+        summary[name] = float(np.mean(model.history.matrix(name, step, step, n_agents)))
+    return summary
+
+
+def _init_worker(base: pd.DataFrame) -> None:
+    global _base
+    _base = base
+
+
+def _run_point(point_index: int, replication: int, point: dict, seed_sequence: np.random.SeedSequence,
+               steps: int, options: tuple, summarize, quiet: bool) -> tuple:
+    """
+    Runs one replication of one design point and returns
+    (point_index, replication, summary).
+    """
+    model = Evolve(population(_base, point), seed = copy.deepcopy(seed_sequence))      # Spawning advances a SeedSequence; keep the caller's intact.
+    for option in options:
+        getattr(model, option)()
+
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        model.proceed(steps)
+    return point_index, replication, summarize(model)
+
+
+def run_sweep(base: pd.DataFrame,
+              design: pd.DataFrame,
+              steps: int,
+              n_replications: int = 1,
+              seed: int = None,
+              options: tuple = (),
+              summarize = final_summary,
+              cost = None,
+              n_workers: int = None,
+              quiet: bool = True) -> pd.DataFrame:
+    """
+    Runs every point of design n_replications times and returns one row per
+    run: the point and replication numbers, the values of the point and the
+    entries of summarize(model).
+
+    Replication r of every point is seeded with the r-th child of
+    np.random.SeedSequence(seed), so points are compared under common random
+    numbers and the results do not depend on the number of workers. Jobs are
+    submitted largest first according to cost, and every worker takes the
+    next job as soon as it is free, so long runs do not end up last.
+     Input:
+       base: the agent table, e.g. GenAgents(file).df.
+       design: one row per point, its columns being model constants
+               (CONSTANTS) or agent columns; see grid(), latin_hypercube()
+               and sobol().
+       steps: number of steps of every run.
+       n_replications: number of runs per point.
+       seed: entropy of the root SeedSequence; None draws fresh entropy.
+       options: names of Evolve methods called before proceeding.
+       summarize: picklable function summarize(model) returning a dict.
+       cost: optional function cost(point) estimating the run time of a point.
+       n_workers: number of processes; None uses os.cpu_count() and 1 runs
+                  the jobs in this process.
+       quiet: drops the output printed by the models.
+    """
+    if n_replications < 1:
+        raise ValueError(f'run_sweep: n_replications = {n_replications} must be at least 1')
+    _check_names(design.columns)
+
+    points = design.to_dict('records')
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_replications)
+    jobs = [(index, replication, point, seed_sequences[replication], steps, tuple(options), summarize, quiet)
+            for (index, point) in enumerate(points) for replication in range(n_replications)]
+    if cost is not None:
+        costs = [cost(point) for point in points]
+        jobs.sort(key = lambda job: costs[job[0]], reverse = True)
+
+    if n_workers == 1:
+        _init_worker(base)
+        results = [_run_point(*job) for job in jobs]
+        _init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers = n_workers, initializer = _init_worker, initargs = (base,)) as executor:
+            futures = [executor.submit(_run_point, *job) for job in jobs]
+            results = [future.result() for future in futures]
+
+    rows = [dict(point = index, replication = replication, **points[index], **summary)
+            for (index, replication, summary) in results]
+    return pd.DataFrame(rows).sort_values(['point', 'replication'], ignore_index = True)
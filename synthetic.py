@@ -0,0 +1,51 @@
+"""
+Synthetic agent populations, for benchmarks and experiments that should not
+depend on an excel sheet.
+"""
+import numpy as np
+import pandas as pd
+from sclib.generate_agents import build_agents
+
+LAYERS = (('r', 1.6), ('m', 1.0), ('s', 0.6))                                  # (role, mean selling price); prices fall upstream.
+
+
+def synthetic_table(n_retailers: int, n_manufacturers: int, n_suppliers: int, seed: int = 0) -> pd.DataFrame:
+    """
+    An agent table (the columns of the excel sheet read by GenAgents) with
+    the given number of agents per layer. Working capital, prices, ordering
+    and delivery periods and payment terms are drawn around values under
+    which orders flow through all three layers.
+    """
+    sizes = (n_retailers, n_manufacturers, n_suppliers)
+    if min(sizes) < 1:
+        raise ValueError(f'synthetic_table: every layer needs at least one agent, not {sizes}')
+    rng = np.random.default_rng(seed)
+    n_agents = sum(sizes)
+    roles = np.repeat([role for (role, _) in LAYERS], sizes)
+    price = np.repeat([price for (_, price) in LAYERS], sizes)
+    return pd.DataFrame({'agent_id': np.arange(n_agents),
+                         'role': roles,
+                         'working_capital': rng.uniform(80, 120, n_agents),
+                         'mu_selling_price': price * rng.uniform(0.95, 1.05, n_agents),
+                         'sigma_selling_price': 0.06,
+                         'q': 0.9,
+                         'consumer_demand_mean': 150.0,
+                         'input_margin': 0.5,
+                         'interest_rate': 0.002,
+                         'fixed_cost': 3.0,
+                         'days_between_financing': 30,
+                         'financing_period': 90,
+                         'ordering_period': rng.integers(1, 4, n_agents),
+                         'delivery_period': rng.integers(1, 4, n_agents),
+                         'fixed_assets': 2000.0,
+                         'payment_term': rng.integers(5, 15, n_agents),
+                         'tc_rate': 0.1,
+                         'long_term_debt': 100.0})
+
+
+def synthetic_agents(n_retailers: int, n_manufacturers: int, n_suppliers: int, seed: int = 0) -> list:
+    """
+    The Agent() objects of synthetic_table(n_retailers, n_manufacturers,
+    n_suppliers, seed).
+    """
+    return build_agents(synthetic_table(n_retailers, n_manufacturers, n_suppliers, seed))
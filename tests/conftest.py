@@ -0,0 +1,65 @@
+"""
+Seeded scenarios shared by the tests. Each one runs a small synthetic
+population through the stages that the alternative code paths of Evolve
+must reproduce: financing with reverse factoring and shuffled orders,
+bankruptcies and payment defaults, and an agent registered mid-run.
+"""
+import numpy as np
+from sclib.evolve import Evolve
+from sclib.generate_agents import build_agents
+from sclib.synthetic import synthetic_table
+
+SCENARIOS = ('financing', 'bankruptcy', 'register_agent')
+STEPS = 300                                                                    # Past step 200, where credit rating starts.
+REGISTER_STEP = 150
+
+
+def scenario_table(scenario: str):
+    """
+    The agent table of a scenario.
+    """
+    table = synthetic_table(12, 8, 8, seed = 3)
+    if scenario == 'bankruptcy':
+        weak = table.index % 4 == 1                                            # High costs and little cash: defaults, then bankruptcy.
+        table.loc[weak, 'fixed_cost'] = 8.0
+        table.loc[weak, 'working_capital'] = 40.0
+    return table
+
+
+def run_scenario(scenario: str, configure = None, steps: int = STEPS) -> Evolve:
+    """
+    Runs a scenario with wcap financing, SC financing and shuffling on.
+    configure(model), if given, switches on the code path under test before
+    the first step.
+    """
+    model = Evolve(build_agents(scenario_table(scenario)), seed = 3)
+    model.activate_wcap_financing()
+    model.activate_SC_financing()
+    model.always_shuffle()
+    if configure is not None:
+        configure(model)
+    if scenario == 'register_agent':
+        model.proceed(REGISTER_STEP)
+        newcomer = synthetic_table(1, 1, 1, seed = 4).iloc[[1]].assign(agent_id = model.next_agent_id)
+        model.register_agent(build_agents(newcomer)[0])
+        model.proceed(steps - REGISTER_STEP)
+    else:
+        model.proceed(steps)
+    return model
+
+
+def assert_same_history(reference: Evolve, model: Evolve, events: bool = True) -> None:
+    """
+    Asserts that two runs recorded the same value for every metric, agent
+    and step, and ended in the same state. events = False skips the event
+    counts, e.g. for a resumed run, which starts with an empty event log.
+    """
+    assert model.current_step == reference.current_step
+    assert model.history.n_agents == reference.history.n_agents
+    for name in reference.history.fill_values:
+        expected = reference.history.matrix(name, 1, reference.current_step, reference.history.n_agents)
+        actual = model.history.matrix(name, 1, model.current_step, model.history.n_agents)
+        np.testing.assert_array_equal(actual, expected, err_msg = name)
+    assert [agent.bankruptcy for agent in model.list_agents] == [agent.bankruptcy for agent in reference.list_agents]
+    if events:
+        assert model.events.counts() == reference.events.counts()
@@ -0,0 +1,29 @@
+import os
+import pytest
+from sclib.evolve import Evolve
+from sclib.checkpoint import Checkpointer
+from conftest import SCENARIOS, STEPS, run_scenario, assert_same_history
+
+
+def every_100_steps(directory: str):
+    return lambda model: model.activate_checkpointing(directory, every_steps = 100, every_seconds = None, keep = 3)
+
+
+@pytest.mark.parametrize('scenario', ('financing', 'bankruptcy'))
+def test_resumed_run_follows_uninterrupted_run(scenario, tmp_path):
+    reference = run_scenario(scenario)
+    run_scenario(scenario, every_100_steps(str(tmp_path)), steps = STEPS - 100)
+    os.remove(Checkpointer.latest(str(tmp_path)))                              # Resumes from step 100 with the segments of steps 101 to 200 left over.
+    model = Evolve.resume(str(tmp_path))
+    assert model.current_step == 100
+    model.deactivate_checkpointing()
+    model.proceed(STEPS - 100)
+    assert_same_history(reference, model, events = False)
+
+
+def test_checkpoints_leave_out_what_segments_hold(tmp_path):
+    run_scenario('financing', every_100_steps(str(tmp_path)))
+    sizes = [os.path.getsize(path) for path in Checkpointer.checkpoints(str(tmp_path))]
+    assert len(sizes) == 3 and sizes[-1] < 1.25 * sizes[0]
+    with pytest.raises(ValueError):
+        Evolve.restore(open(Checkpointer.latest(str(tmp_path)), 'rb').read())
@@ -0,0 +1,14 @@
+import pytest
+from sclib.discount import DiscountTables
+from conftest import run_scenario
+
+
+@pytest.mark.parametrize('rate', (0.0, 0.031, 0.15, 0.4872))
+def test_factor_equals_table_growth(rate):
+    tables = DiscountTables(360)
+    assert [tables.factor(rate, periods) for periods in range(-5, 200)] == [tables.growth(rate, periods) for periods in range(-5, 200)]
+
+
+def test_buyer_rates_build_no_tables():
+    model = run_scenario('financing')
+    assert {rate for (rate, _) in model.discount._tables} == {agent.financing_rate for agent in model.list_agents}
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from sclib.draws import StepDraws
+from sclib.generate_agents import build_agents
+from sclib.synthetic import synthetic_table
+from conftest import SCENARIOS, run_scenario, assert_same_history
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+@pytest.mark.parametrize('block_steps', (7, 64))
+def test_draw_blocks_follow_per_step_draws(scenario, block_steps):
+    reference = run_scenario(scenario)
+    model = run_scenario(scenario, lambda model: model.activate_draw_blocks(block_steps))
+    assert_same_history(reference, model)
+
+
+def test_prices_are_the_lognormal_draws_of_each_agent():
+    agents = build_agents(synthetic_table(5, 4, 4, seed = 3))
+    draws = StepDraws(agents, np.random.default_rng(11), np.random.default_rng(12), block_steps = 8)
+    rng = np.random.default_rng(11)
+    for step in range(1, 21):
+        expected = [rng.lognormal(np.log(agent.mu_selling_price), agent.sigma_selling_price) for agent in agents]
+        np.testing.assert_allclose(draws.prices(step), expected, rtol = 1e-12)
@@ -0,0 +1,29 @@
+from operator import attrgetter
+import pytest
+from conftest import SCENARIOS, run_scenario, assert_same_history
+
+
+class LinearScan:
+    """
+    The allocation before PriceIndex: every order filters the whole layer
+    and sorts the sellers it may use by price.
+    """
+    def __init__(self, layer: list):
+        self.layer = layer
+        self.agents = list()
+
+    def below(self, price_limit: float) -> range:
+        self.agents = sorted((agent for agent in self.layer if agent.prod_cap > 0 and agent.selling_price < price_limit and not agent.bankruptcy),
+                             key = attrgetter('selling_price'))
+        return range(len(self.agents))
+
+
+def scan_layers(model) -> None:
+    model.price_index = lambda role: LinearScan(model.man_list if role == 'm' else model.sup_list)
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_price_index_follows_linear_scan(scenario):
+    reference = run_scenario(scenario, scan_layers)
+    model = run_scenario(scenario)
+    assert_same_history(reference, model)
@@ -0,0 +1,46 @@
+from statistics import mean
+import numpy as np
+import pytest
+from sclib.vectorized import correctly_rounded_mean
+from conftest import SCENARIOS, run_scenario, assert_same_history
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_vectorized_engine_follows_object_engine(scenario):
+    reference = run_scenario(scenario)
+    model = run_scenario(scenario, lambda model: model.activate_vectorized_engine())
+    assert_same_history(reference, model)
+
+
+def test_scenarios_reach_the_stages_they_cover():
+    counts = run_scenario('bankruptcy').events.counts()
+    assert counts['bankruptcy'] > 0 and counts['default'] > 0
+    model = run_scenario('register_agent')
+    assert len(model.list_agents) == model.history.n_agents == 29
+    assert model.events.counts()['error'] == 0
+
+
+def mean_columns():
+    rng = np.random.default_rng(7)
+    columns = [rng.uniform(80, 120, (31, 50)),                                 # Working capital like.
+               rng.uniform(-1e3, 1e3, (30, 50)),                               # Cancellation around zero.
+               rng.lognormal(0, 8, (17, 50)),                                  # Wide range of magnitudes.
+               100 + rng.integers(-4, 5, (30, 50)) * 2.0 ** -40,               # Narrow range: rounding ties.
+               rng.uniform(1e300, 1.7e308, (3, 50)),                           # Sum overflows.
+               np.full((1, 50), 3.25)]
+    edge = rng.uniform(0, 1, (6, 4))
+    edge[0, 0], edge[1, 1], edge[2, 2], edge[3, 3] = np.inf, -np.inf, np.nan, 5e-324
+    return columns + [edge]
+
+
+@pytest.mark.parametrize('values', mean_columns())
+def test_correctly_rounded_mean_matches_statistics_mean(values):
+    expected = [mean(column) for column in values.T.tolist()]
+    np.testing.assert_array_equal(correctly_rounded_mean(values), expected)
+
+
+def test_correctly_rounded_mean_checks_its_row_count():
+    with pytest.raises(ValueError):
+        correctly_rounded_mean(np.broadcast_to(1.0, (1 << 26, 1)))
+    with pytest.raises(ValueError):
+        correctly_rounded_mean(np.empty((0, 3)))
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sclib.volatility import RollingVolatility, RollingVolatilityArray
+
+
+def asset_paths(n_agents: int, steps: int) -> np.ndarray:
+    rng = np.random.default_rng(5)
+    paths = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (steps, n_agents)), axis = 0))
+    paths[steps // 2:, -1] = 0.0                                              # Wiped out: log returns of -inf, then nan.
+    return paths
+
+
+def direct_sigma(assets: list, window: int) -> float:
+    """
+    The computation the estimator replaced: the standard deviation of the
+    window sums of the daily log returns, without the newest window.
+    """
+    daily = np.diff(np.log(assets))
+    sums = [sum(daily[i:i + window]) for i in range(len(daily) - window)]
+    return np.std(sums) if sums else np.nan
+
+
+@pytest.mark.parametrize('window', (5, 180))
+def test_rolling_volatility_follows_direct_computation(window):
+    assets = asset_paths(2, 3 * window + 7)[:, 0].tolist()
+    estimator = RollingVolatility(window)
+    for step in range(len(assets)):
+        estimator.push(assets[step])
+        expected = direct_sigma(assets[:step + 1], window)
+        if np.isnan(expected):
+            assert np.isnan(estimator.sigma)
+        else:
+            assert estimator.sigma == pytest.approx(expected, rel = 1e-9, abs = 1e-15)
+
+
+def test_array_follows_estimators():
+    window = 6
+    paths = asset_paths(4, 40)
+    estimators = [RollingVolatility(window) for _ in range(4)]
+    volatility = RollingVolatilityArray.from_estimators(estimators)
+    for (step, assets) in enumerate(paths):
+        rows = np.array([row for row in range(4) if row != 2 or step % 3], dtype = int)   # Row 2 skips steps, like a bankrupt agent.
+        for row in rows.tolist():
+            estimators[row].push(float(assets[row]))
+        with np.errstate(invalid = 'ignore'):
+            volatility.push(rows, assets[rows])
+        np.testing.assert_array_equal(volatility.sigma(np.arange(4)), [estimator.sigma for estimator in estimators])
+    restored = RollingVolatility(window)
+    volatility.to_estimator(0, restored)
+    restored.push(123.0)
+    estimators[0].push(123.0)
+    assert restored.sigma == estimators[0].sigma
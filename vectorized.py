@@ -0,0 +1,275 @@
+from statistics import mean
+from operator import attrgetter
+import numpy as np
+from sclib.agent import Agent
+from sclib.volatility import RollingVolatilityArray
+
+FLOAT_FIELDS = ('working_capital', 'total_assets', 'total_liabilities', 'equity',
+                'liability', 'inventory_value', 'receivables_value', 'payables_value',
+                'fixed_assets', 'long_term_debt', 'prod_cap', 'mu_selling_price',
+                'sigma_assets', 'distance_to_default', 'default_probability',
+                'interest_rate', 'current_credit_capacity', 'financing_rate',
+                'SCF_capacity', 'total_credit_capacity', 'time_of_next_allowed_financing')
+INT_FIELDS = ('financing_period', 'days_between_financing')
+BOOL_FIELDS = ('bankruptcy', 'credit_availability', 'SCF_availability')
+FIELDS = FLOAT_FIELDS + INT_FIELDS + BOOL_FIELDS
+
+
+def correctly_rounded_mean(values: np.ndarray) -> np.ndarray:
+    """
+    The mean of each column of values, rounded like statistics.mean(): the
+    float nearest to the exact mean. The exact sum is kept as total + error
+    (TwoSum), the candidate is checked against it with an exact residual
+    (Dekker's split, exact for fewer than 2 ** 26 rows) and moved by one ulp
+    when the neighbour is closer. Columns that cannot be certified, i.e. near
+    a rounding tie or with non-finite values, go to statistics.mean().
+    """
+    n = values.shape[0]
+    if not 0 < n < 1 << 26:
+        raise ValueError(f'correctly_rounded_mean: {n} rows; 1 to 2 ** 26 - 1 are supported')
+    total = values[0].copy()
+    error = np.zeros_like(total)
+    with np.errstate(all = 'ignore'):                                          # Non-finite columns are left to statistics.mean().
+        for row in values[1:]:
+            summed = total + row
+            virtual = summed - total
+            error += (total - (summed - virtual)) + (row - virtual)
+            total = summed
+        candidate = (total + error) / n
+        split = candidate * 134217729.0                                        # 2 ** 27 + 1
+        high = split - (split - candidate)                                     # high * n and low * n are exact.
+        low = candidate - high
+        residual = ((total - high * n) - low * n) + error                      # n * (exact mean - candidate)
+        gap = np.minimum(np.spacing(np.abs(candidate)), np.abs(candidate - np.nextafter(candidate, -np.sign(candidate))))
+        step = np.where(residual > 0, np.nextafter(candidate, np.inf), np.nextafter(candidate, -np.inf)) - candidate
+        closer = np.abs(residual - step * n) < np.abs(residual)
+        candidate = np.where(closer, candidate + step, candidate)
+        residual = np.where(closer, residual - step * n, residual)
+        eps = np.finfo(float).eps
+        margin = 4 * eps * np.abs(residual) + n * n * eps * eps * np.abs(values).sum(axis = 0)
+        certain = np.isfinite(candidate) & (np.abs(residual) < 0.5 * n * gap - margin)
+    for column in np.flatnonzero(~certain).tolist():
+        candidate[column] = mean(values[:, column].tolist())
+    return candidate
+
+
+class AgentArrays:
+    """
+    Gather/scatter buffers for the vectorized phases of a model. The Agent()
+    objects in list_agents remain the source of truth for every field; cell i
+    of a column belongs to list_agents[i]. A vectorized phase gathers the
+    fields it reads into columns (__load, one attrgetter pass per field), runs
+    on whole arrays and scatters the fields it wrote back into the agents
+    (__store, one setattr per agent and field). The per-agent phases are thus
+    untouched, while a vectorized phase costs O(agents) attribute accesses
+    per field on top of its array work, which only pays off for phases whose
+    per-agent work is heavier than copying their fields: balance sheets,
+    credit ratings, interest rates and credit availability. Only the
+    volatility windows (volatility) are held in the arrays alone.
+
+    Every column has one cell per agent at all times, so that a phase may
+    write some rows of a column it has not gathered and store only those.
+    """
+    def __init__(self, list_agents: list):
+        """
+        constructor
+         Input:
+           list_agents: the list_agents of the model.
+        """
+        self.list_agents = list_agents
+        self.risk_free_rate = np.array([agent.risk_free_rate for agent in list_agents], dtype = float)
+        self.interest_rate_margin = np.array([agent.interest_rate_margin for agent in list_agents], dtype = float)
+        self.volatility = RollingVolatilityArray.from_estimators([agent.asset_volatility for agent in list_agents])
+        self.agent_ids = np.array([agent.agent_id for agent in list_agents], dtype = int)
+        self.roles = np.array([agent.role for agent in list_agents])
+        self.positions = {agent.agent_id: position for (position, agent) in enumerate(list_agents)}
+        self._rf_agents = list()                                               # Agents that got RF_eligible_contracts last step.
+        self.columns = dict()
+        self.__load(*FIELDS)
+
+    def add(self, agent: Agent) -> None:
+        """
+        Adds a cell for an agent that has just been appended to list_agents.
+        """
+        self.risk_free_rate = np.append(self.risk_free_rate, agent.risk_free_rate)
+        self.interest_rate_margin = np.append(self.interest_rate_margin, agent.interest_rate_margin)
+        self.volatility.append(agent.asset_volatility)
+        self.agent_ids = np.append(self.agent_ids, agent.agent_id)
+        self.roles = np.append(self.roles, agent.role)
+        self.positions[agent.agent_id] = len(self.agent_ids) - 1
+        self.__load(*FIELDS)
+
+    def release(self) -> None:
+        """
+        Copies the asset volatility windows back into the agents, before the
+        model returns to the object engine.
+        """
+        for position, agent in enumerate(self.list_agents):
+            self.volatility.to_estimator(position, agent.asset_volatility)
+
+    def __load(self, *names: str) -> dict:
+        """
+        Gathers the attributes names of all agents into their columns and
+        returns the columns.
+        """
+        agents = self.list_agents
+        for name in names:
+            dtype = bool if name in BOOL_FIELDS else int if name in INT_FIELDS else float
+            self.columns[name] = np.fromiter(map(attrgetter(name), agents), dtype = dtype, count = len(agents))
+        return self.columns
+
+    def __store(self, name: str, rows: np.ndarray = None) -> None:
+        """
+        Scatters column name, at rows or everywhere, into the attributes of
+        the agents after a vectorized phase has written it.
+        """
+        column = self.columns[name]
+        agents = self.list_agents
+        if rows is None:
+            for (agent, value) in zip(agents, column.tolist()):
+                setattr(agent, name, value)
+        else:
+            for (position, value) in zip(rows.tolist(), column[rows].tolist()):
+                setattr(agents[position], name, value)
+
+    def update_balance_sheet(self, step: int, credit_rating: bool, history) -> None:
+        """
+        Array version of Evolve.update_total_assets_and_liabilities_and_equity();
+        the balance sheets are recorded in history (a HistoryStore).
+        """
+        c = self.__load('bankruptcy', 'working_capital', 'fixed_assets', 'inventory_value', 'receivables_value',
+                        'liability', 'payables_value', 'long_term_debt')
+        rows = np.flatnonzero(~c['bankruptcy'])
+        total_assets = c['working_capital'][rows] + c['fixed_assets'][rows] + c['inventory_value'][rows] + c['receivables_value'][rows]
+        total_liabilities = c['liability'][rows] + c['payables_value'][rows] + c['long_term_debt'][rows]
+        equity = total_assets - total_liabilities
+        c['total_assets'][rows] = total_assets
+        c['total_liabilities'][rows] = total_liabilities
+        c['equity'][rows] = equity
+        for name in ('total_assets', 'total_liabilities', 'equity'):
+            self.__store(name, rows)
+
+        self.volatility.push(rows, total_assets)
+        if credit_rating:
+            c['sigma_assets'][rows] = self.volatility.sigma(rows)
+            self.__store('sigma_assets', rows)
+
+        ids = self.agent_ids[rows]
+        history.record('total_assets', step, ids, total_assets)
+        history.record('total_liabilities', step, ids, total_liabilities)
+        history.record('equity', step, ids, equity)
+
+    def credit_calculations(self, step: int, norm_cdf, history) -> None:
+        """
+        Array version of Evolve.credit_calculations(); default probabilities
+        are recorded in history (a HistoryStore).
+        """
+        c = self.__load('bankruptcy', 'total_assets', 'total_liabilities', 'sigma_assets')
+        rows = np.flatnonzero(~c['bankruptcy'])
+        total_assets = c['total_assets'][rows]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            distance_to_default = (total_assets - c['total_liabilities'][rows]) / (total_assets * c['sigma_assets'][rows])
+        default_probability = norm_cdf(-distance_to_default)
+        c['distance_to_default'][rows] = distance_to_default
+        c['default_probability'][rows] = default_probability
+        self.__store('distance_to_default', rows)
+        self.__store('default_probability', rows)
+        history.record('default_probability', step, self.agent_ids[rows], default_probability)
+
+    def calculate_interest_rates(self) -> None:
+        """
+        Array version of Evolve.calculate_agent_interest_rate().
+        """
+        c = self.__load('bankruptcy', 'default_probability')
+        rows = np.flatnonzero(~c['bankruptcy'])
+        margin = self.interest_rate_margin[rows]
+        risk_free_rate = self.risk_free_rate[rows]
+        new_rate = c['default_probability'][rows] + margin
+        c['interest_rate'][rows] = np.where(new_rate <= risk_free_rate, risk_free_rate + margin, new_rate)
+        self.__store('interest_rate', rows)
+
+    def check_credit_availability(self, step: int, history) -> None:
+        """
+        Array version of Evolve.check_credit_availability(). The mean working
+        capital over the financing window is taken for all agents with the
+        same days_between_financing at once, from history (a HistoryStore),
+        with the rounding of statistics.mean().
+        """
+        c = self.__load('time_of_next_allowed_financing', 'liability', 'total_credit_capacity', 'bankruptcy',
+                        'days_between_financing')
+        available = (step >= c['time_of_next_allowed_financing']) & (c['liability'] < c['total_credit_capacity']) & ~c['bankruptcy']
+        c['credit_availability'][:] = available
+        self.__store('credit_availability')
+        rows = np.flatnonzero(available)
+        ids = self.agent_ids[rows]
+        days = c['days_between_financing'][rows]
+        recorded = history.counts['working_capital'][ids] > days
+        capacity = np.full(len(rows), 100.0)                                   # Too short a record to average.
+        for members in np.unique(days[recorded]).tolist():
+            selected = recorded & (days == members)
+            capacity[selected] = correctly_rounded_mean(history.recent('working_capital', ids[selected], step - 1, members))
+        c['total_credit_capacity'][rows] = capacity
+        c['current_credit_capacity'][rows] = capacity - c['liability'][rows]
+        self.__store('total_credit_capacity', rows)
+        self.__store('current_credit_capacity', rows)
+
+    def check_reverse_factoring_availability(self, ledger) -> None:
+        """
+        Array version of Evolve.check_reverse_factoring_availability(): an
+        upstream agent can sell receivables when one of its buyers in ledger
+        (a TradeCreditLedger) has a lower default probability.
+        """
+        c = self.__load('default_probability')
+        upstream = np.flatnonzero(self.roles != 'r')
+        sellers = list()
+        buyers = list()
+        for position in upstream.tolist():
+            buyer_ids = ledger.buyers(self.list_agents[position])
+            sellers.extend([position] * len(buyer_ids))
+            buyers.extend([self.positions[buyer_id] for buyer_id in buyer_ids])
+        sellers = np.array(sellers, dtype = int)
+        buyers = np.array(buyers, dtype = int)
+        default_probability = c['default_probability']
+        availability = np.zeros(len(self.list_agents), dtype = bool)
+        availability[sellers[default_probability[buyers] < default_probability[sellers]]] = True
+        c['SCF_availability'][upstream] = availability[upstream]
+        self.__store('SCF_availability', upstream)
+
+    def record_working_capital(self, step: int, history) -> None:
+        """
+        Array version of Evolve.check_working_capital().
+        """
+        c = self.__load('bankruptcy', 'working_capital')
+        rows = np.flatnonzero(~c['bankruptcy'])
+        history.record('working_capital', step, self.agent_ids[rows], c['working_capital'][rows])
+
+    def determine_capacity(self, wcap_financing: bool, SC_financing: bool, year: int, SCF_capacity) -> None:
+        """
+        Array version of Evolve.determine_capacity(). SCF_capacity(agent) fills
+        the RF_eligible_contracts and SCF_capacity of an agent that can sell
+        receivables; it is only called for those agents.
+        """
+        c = self.__load('working_capital', 'mu_selling_price')
+        for agent in self._rf_agents:
+            agent.RF_eligible_contracts = list()
+        for agent in self.list_agents:
+            agent.SCF_capacity = 0
+        self._rf_agents = list()
+
+        funds = c['working_capital']
+        if wcap_financing:                                                     # Without it, only the working capital is used.
+            self.__load('bankruptcy', 'credit_availability', 'current_credit_capacity', 'financing_rate', 'financing_period')
+            credit = c['credit_availability'] & ~c['bankruptcy']
+            discounted_credit = c['current_credit_capacity'] * (1 / (1 + (c['financing_rate'] / year)) ** c['financing_period'])
+            if SC_financing:
+                with_SCF = credit & self.__load('SCF_availability')['SCF_availability']
+                self._rf_agents = [self.list_agents[position] for position in np.flatnonzero(with_SCF).tolist()]
+                for agent in self._rf_agents:
+                    SCF_capacity(agent)
+                self.__load('SCF_capacity')
+                funds = np.where(with_SCF, funds + discounted_credit + c['SCF_capacity'], funds)
+            else:
+                funds = np.where(credit, funds + discounted_credit, funds)
+        capacity = funds / (c['mu_selling_price'] + 0.1)
+        c['prod_cap'] = np.where(capacity > 0, capacity, 0.0)
+        self.__store('prod_cap')
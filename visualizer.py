@@ -1,5 +1,4 @@
 from typing import List
-import matplotlib.pyplot as plt
 from pandas import DataFrame
 
 class Visualizer:
@@ -0,0 +1,214 @@
+import math
+from array import array
+import numpy as np
+
+def log(value: float) -> float:
+    """
+    math.log() with the numpy conventions for non-positive values.
+    """
+    if value > 0:
+        return math.log(value)
+    if value == 0:
+        return -math.inf
+    return math.nan
+
+class RollingVolatility:
+    """
+    Incremental estimator of the volatility of total assets of an agent.
+    Every step the log return of total assets is pushed into a ring buffer
+    holding the last `window` returns. Each time the buffer is full, the sum of
+    the returns it holds (a half-yearly log return) becomes a new sample, and
+    the running moments of all samples seen so far give sigma. The result is
+    the same as taking the standard deviation over the rolling window sums of
+    diff(log(list_assets)), but each push costs O(1) and the state is bounded
+    by the window length.
+    """
+    __slots__ = ('window', '_returns', '_position', '_filled', '_window_sum', '_last_log',
+                 '_pushes_since_resync', 'n_samples', '_mean', '_m2')
+
+    def __init__(self, window: int = 180):
+        """
+        constructor
+         Input:
+           window: number of daily log returns summed into one sample.
+        """
+        self.window = window
+        self._returns = None                                                   # Ring buffer of the last `window` log returns, as raw doubles; allocated by the first push.
+        self._position = 0
+        self._filled = 0
+        self._window_sum = 0.0
+        self._last_log = None
+        self._pushes_since_resync = 0
+        self.n_samples = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, total_assets: float) -> None:
+        """
+        Adds the total assets of the current step.
+        """
+        current_log = log(total_assets)
+        if self._last_log is None:
+            self._last_log = current_log
+            if self._returns is None:
+                self._returns = array('d', bytes(8 * self.window))
+            return
+        log_return = current_log - self._last_log
+        self._last_log = current_log
+
+        if self._filled == self.window:                                        # The window before this return is complete.
+            self.__add_sample(self._window_sum)
+            self._window_sum -= self._returns[self._position]
+        else:
+            self._filled += 1
+        self._returns[self._position] = log_return
+        self._window_sum += log_return
+        self._position = (self._position + 1) % self.window
+
+        self._pushes_since_resync += 1
+        if self._pushes_since_resync == self.window:                           # Clears the rounding error of the running sum.
+            self._window_sum = sum(self._returns[:self._filled])
+            self._pushes_since_resync = 0
+
+    def __add_sample(self, value: float) -> None:
+        """
+        Welford's update of the running mean and sum of squared deviations.
+        """
+        self.n_samples += 1
+        delta = value - self._mean
+        self._mean += delta / self.n_samples
+        self._m2 += delta * (value - self._mean)
+
+    @property
+    def sigma(self) -> float:
+        """
+        Population standard deviation of the samples, nan if there are none.
+        """
+        if not self.n_samples:
+            return math.nan
+        return math.sqrt(max(self._m2, 0.0) / self.n_samples)
+
+
+class RollingVolatilityArray:
+    """
+    The RollingVolatility estimator for a whole population at once. Row i of
+    every array holds the state of the estimator of agent i, so one call to
+    push() updates all agents that are still active with array operations.
+    """
+    def __init__(self, n_agents: int, window: int = 180):
+        """
+        constructor
+         Input:
+           n_agents: number of rows.
+           window: number of daily log returns summed into one sample.
+        """
+        self.window = window
+        self.returns = np.zeros((n_agents, window))
+        self.position = np.zeros(n_agents, dtype = int)
+        self.filled = np.zeros(n_agents, dtype = int)
+        self.window_sum = np.zeros(n_agents)
+        self.last_log = np.zeros(n_agents)
+        self.has_last = np.zeros(n_agents, dtype = bool)
+        self.pushes_since_resync = np.zeros(n_agents, dtype = int)
+        self.n_samples = np.zeros(n_agents, dtype = int)
+        self.mean = np.zeros(n_agents)
+        self.m2 = np.zeros(n_agents)
+
+    @classmethod
+    def from_estimators(cls, estimators: list) -> 'RollingVolatilityArray':
+        """
+        Stacks the state of per-agent RollingVolatility objects, which must
+        share the same window.
+        """
+        window = estimators[0].window if estimators else 180
+        for estimator in estimators:
+            if estimator.window != window:
+                raise ValueError(f'from_estimators: window {estimator.window} differs from {window}')
+        array = cls(len(estimators), window)                                   # Filled row by row; append() would copy all rows per estimator.
+        for (row, estimator) in enumerate(estimators):
+            if estimator._returns is not None:
+                array.returns[row] = estimator._returns
+            array.position[row] = estimator._position
+            array.filled[row] = estimator._filled
+            array.window_sum[row] = estimator._window_sum
+            array.has_last[row] = estimator._last_log is not None
+            array.last_log[row] = estimator._last_log if estimator._last_log is not None else 0.0
+            array.pushes_since_resync[row] = estimator._pushes_since_resync
+            array.n_samples[row] = estimator.n_samples
+            array.mean[row] = estimator._mean
+            array.m2[row] = estimator._m2
+        return array
+
+    def append(self, estimator: RollingVolatility) -> None:
+        """
+        Adds a row holding the state of a RollingVolatility object.
+        """
+        if estimator.window != self.window:
+            raise ValueError(f'append: window {estimator.window} differs from {self.window}')
+        self.returns = np.vstack([self.returns, [estimator._returns if estimator._returns is not None else np.zeros(self.window)]])
+        self.position = np.append(self.position, estimator._position)
+        self.filled = np.append(self.filled, estimator._filled)
+        self.window_sum = np.append(self.window_sum, estimator._window_sum)
+        has_last = estimator._last_log is not None
+        self.last_log = np.append(self.last_log, estimator._last_log if has_last else 0.0)
+        self.has_last = np.append(self.has_last, has_last)
+        self.pushes_since_resync = np.append(self.pushes_since_resync, estimator._pushes_since_resync)
+        self.n_samples = np.append(self.n_samples, estimator.n_samples)
+        self.mean = np.append(self.mean, estimator._mean)
+        self.m2 = np.append(self.m2, estimator._m2)
+
+    def to_estimator(self, row: int, estimator: RollingVolatility) -> None:
+        """
+        Writes the state of one row back into a RollingVolatility object.
+        """
+        estimator._returns = array('d', self.returns[row].tobytes())
+        estimator._position = int(self.position[row])
+        estimator._filled = int(self.filled[row])
+        estimator._window_sum = float(self.window_sum[row])
+        estimator._last_log = float(self.last_log[row]) if self.has_last[row] else None
+        estimator._pushes_since_resync = int(self.pushes_since_resync[row])
+        estimator.n_samples = int(self.n_samples[row])
+        estimator._mean = float(self.mean[row])
+        estimator._m2 = float(self.m2[row])
+
+    def push(self, rows: np.ndarray, total_assets: np.ndarray) -> None:
+        """
+        Adds the total assets of the current step for the given rows.
+        """
+        current_log = np.fromiter(map(log, total_assets.tolist()), float, len(total_assets))   # Same rounding as RollingVolatility.
+        first = ~self.has_last[rows]
+        self.last_log[rows[first]] = current_log[first]
+        self.has_last[rows[first]] = True
+        rows, current_log = rows[~first], current_log[~first]
+
+        log_return = current_log - self.last_log[rows]
+        self.last_log[rows] = current_log
+
+        full = self.filled[rows] == self.window
+        sampled = rows[full]
+        value = self.window_sum[sampled]
+        self.n_samples[sampled] += 1
+        delta = value - self.mean[sampled]
+        self.mean[sampled] += delta / self.n_samples[sampled]
+        self.m2[sampled] += delta * (value - self.mean[sampled])
+        self.window_sum[sampled] -= self.returns[sampled, self.position[sampled]]
+        self.filled[rows[~full]] += 1
+
+        position = self.position[rows]
+        self.returns[rows, position] = log_return
+        self.window_sum[rows] += log_return
+        self.position[rows] = (position + 1) % self.window
+
+        self.pushes_since_resync[rows] += 1
+        resync = rows[self.pushes_since_resync[rows] == self.window]
+        self.window_sum[resync] = self.returns[resync].cumsum(axis = 1)[:, -1]    # Summed left to right like sum(); unfilled slots hold zeros.
+        self.pushes_since_resync[resync] = 0
+
+    def sigma(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Population standard deviation of the samples of each row, nan for
+        rows without samples.
+        """
+        n_samples = self.n_samples[rows]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return np.where(n_samples > 0, np.sqrt(np.maximum(self.m2[rows], 0.0) / n_samples), np.nan)